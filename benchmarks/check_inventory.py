@@ -0,0 +1,131 @@
+"""
+Time of the inventory drift check and repair on a large catalog.
+
+Fills a fresh SQLite database with --books books (a share of them
+sharded), --loans active borrowings and --drift books whose stock is
+off, then times `find_drift()` over the whole catalog and the repair of
+what it found.
+
+    python benchmarks/check_inventory.py --books 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from library_service_api.models import (  # noqa: E402
+    Book,
+    BookInventorySlot,
+    Borrowing
+)
+from library_service_api.services.inventory_service import (  # noqa: E402
+    find_drift,
+    repair_drift
+)
+
+BATCH = 50_000
+
+
+def fill(books, loans, drift, sharded, seed=42):
+    rng = random.Random(seed)
+    user = get_user_model().objects.create_user(
+        email="inventory-benchmark@example.com", password="benchmark"
+    )
+    on_loan = [0] * (books + 1)
+    for _ in range(loans):
+        on_loan[rng.randint(1, books)] += 1
+
+    with transaction.atomic():
+        for start in range(1, books + 1, BATCH):
+            ids = range(start, min(start + BATCH, books + 1))
+            Book.objects.bulk_create(
+                Book(
+                    id=book_id,
+                    title=f"Book {book_id}",
+                    author="Benchmark",
+                    daily_fee=Decimal("1.00"),
+                    inventory=0 if book_id <= sharded else 5,
+                    inventory_shards=4 if book_id <= sharded else 0,
+                    total_copies=5 + on_loan[book_id],
+                )
+                for book_id in ids
+            )
+        BookInventorySlot.objects.bulk_create(
+            BookInventorySlot(book_id=book_id, slot=slot, count=count)
+            for book_id in range(1, sharded + 1)
+            for slot, count in enumerate([2, 1, 1, 1])
+        )
+        borrowings = (
+            Borrowing(
+                expected_return_date=date.today(),
+                book_id=book_id,
+                user=user
+            )
+            for book_id in range(1, books + 1)
+            for _ in range(on_loan[book_id])
+        )
+        Borrowing.objects.bulk_create(borrowings, batch_size=BATCH)
+        drifted = rng.sample(range(sharded + 1, books + 1), drift)
+        Book.objects.filter(id__in=drifted).update(inventory=4)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--loans", type=int, default=200_000)
+    parser.add_argument("--drift", type=int, default=1_000)
+    parser.add_argument("--sharded", type=int, default=100)
+    args = parser.parse_args()
+
+    if connection.vendor != "sqlite":
+        parser.error("set DATABASE_ENGINE=sqlite3 to run this benchmark")
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection.close()
+        connection.settings_dict["NAME"] = os.path.join(
+            directory, "inventory.sqlite3"
+        )
+        call_command("migrate", verbosity=0)
+
+        started = time.perf_counter()
+        fill(args.books, args.loans, args.drift, args.sharded)
+        print(f"{args.books} books, {args.loans} loans "
+              f"filled in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        drifted = list(find_drift().values_list("id", flat=True))
+        print(f"check:  {len(drifted)} drifted books found in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        repaired, _ = repair_drift(drifted)
+        print(f"repair: {repaired} books in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        left = find_drift().count()
+        print(f"recheck: {left} drifted books in "
+              f"{time.perf_counter() - started:.1f}s")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
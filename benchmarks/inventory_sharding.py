@@ -0,0 +1,133 @@
+"""
+Borrow throughput for one hot title with different shard counts.
+
+Every worker thread borrows and returns the same book in a loop through
+the API, so each borrow runs the real create path: stock decrement,
+borrowing and payment inserts, a checkout session on the bundled fake
+Stripe server (its latency is how long the borrow transaction stays
+open) and the rollup and trending updates after the commit. Run it
+against PostgreSQL; SQLite locks the whole database on write, so
+sharding cannot help there.
+
+    python benchmarks/inventory_sharding.py --threads 16 --shards 0 1 4 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import stripe  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from library_service_api.models import Book  # noqa: E402
+from library_service_api.services.fake_stripe import (  # noqa: E402
+    FakeStripeServer
+)
+from library_service_api.services.inventory_service import (  # noqa: E402
+    set_shards
+)
+
+
+def worker(user, book, deadline, counter, lock):
+    client = APIClient(SERVER_NAME="localhost")
+    client.force_authenticate(user=user)
+    borrow = {
+        "book_id": book.id,
+        "expected_return_date": (date.today() + timedelta(days=3)).isoformat()
+    }
+    done = 0
+    while time.monotonic() < deadline:
+        res = client.post(
+            reverse("library_service_api:borrowings-list"),
+            borrow,
+            format="json"
+        )
+        if res.status_code != 201:
+            continue
+        done += 1
+        client.post(reverse(
+            "library_service_api:borrowings-return", args=[res.data["id"]]
+        ))
+    connection.close()
+    with lock:
+        counter.append(done)
+
+
+def run(user, shards, threads, seconds, copies):
+    book = Book.objects.create(
+        title="Benchmark bestseller",
+        author="Benchmark",
+        daily_fee=Decimal("1.00"),
+        inventory=copies,
+    )
+    book = set_shards(book, shards)
+    counter, lock = [], threading.Lock()
+    deadline = time.monotonic() + seconds
+    pool = [
+        threading.Thread(
+            target=worker,
+            args=(user, book, deadline, counter, lock)
+        )
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    book.delete()
+    return sum(counter) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.02,
+        help="Fake Stripe latency in seconds",
+    )
+    parser.add_argument("--copies", type=int, default=1000)
+    parser.add_argument(
+        "--shards", type=int, nargs="+", default=[0, 1, 2, 4, 8, 16]
+    )
+    args = parser.parse_args()
+
+    server = FakeStripeServer(latency=args.latency)
+    stripe.api_base = server.start()
+    stripe.api_key = "sk_fake"
+    user = get_user_model().objects.create_user(
+        email="sharding-benchmark@example.com", password="benchmark"
+    )
+
+    print(f"{connection.vendor}, {args.threads} threads, Stripe latency "
+          f"{args.latency * 1000:.0f} ms")
+    print(f"{'shards':>8} {'borrows/s':>12}")
+    try:
+        for shards in args.shards:
+            rate = run(
+                user, shards, args.threads, args.seconds, args.copies
+            )
+            print(f"{shards:>8} {rate:>12.1f}")
+    finally:
+        user.delete()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
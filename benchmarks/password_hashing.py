@@ -0,0 +1,80 @@
+"""
+Logins per second per core for the available password hashing policies.
+
+A login costs one password verification, so the rate of check_password()
+calls in a single process is the login throughput of one core.
+
+    python benchmarks/password_hashing.py --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import check_password  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+PBKDF2 = "library_service_users.hashers.TunedPBKDF2PasswordHasher"
+ARGON2 = "library_service_users.hashers.TunedArgon2PasswordHasher"
+
+POLICIES = {
+    "pbkdf2 1,000,000 iterations (Django default)": {
+        "PASSWORD_HASHERS": [PBKDF2],
+        "PASSWORD_PBKDF2_ITERATIONS": 1_000_000,
+    },
+    "pbkdf2 600,000 iterations (OWASP minimum)": {
+        "PASSWORD_HASHERS": [PBKDF2],
+        "PASSWORD_PBKDF2_ITERATIONS": 600_000,
+    },
+    "argon2id t=2 m=100MiB p=8 (Django default)": {
+        "PASSWORD_HASHERS": [ARGON2],
+        "PASSWORD_ARGON2_TIME_COST": 2,
+        "PASSWORD_ARGON2_MEMORY_COST": 102400,
+        "PASSWORD_ARGON2_PARALLELISM": 8,
+    },
+    "argon2id t=2 m=19MiB p=1 (OWASP minimum)": {
+        "PASSWORD_HASHERS": [ARGON2],
+        "PASSWORD_ARGON2_TIME_COST": 2,
+        "PASSWORD_ARGON2_MEMORY_COST": 19456,
+        "PASSWORD_ARGON2_PARALLELISM": 1,
+    },
+}
+
+
+def measure(seconds):
+    encoded = make_password("correct horse battery staple")
+    logins = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password("correct horse battery staple", encoded)
+        logins += 1
+    return logins / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"{'policy':<48} {'logins/s/core':>14}")
+    for name, policy in POLICIES.items():
+        try:
+            with override_settings(**policy):
+                rate = measure(args.seconds)
+        except ValueError as error:
+            print(f"{name:<48} {'n/a':>14}  ({error})")
+            continue
+        print(f"{name:<48} {rate:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
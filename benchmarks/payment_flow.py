@@ -0,0 +1,140 @@
+"""
+Borrow -> pay -> return flows per second against the fake Stripe server.
+
+Starts the bundled fake Stripe API in-process, points the stripe library
+at it and drives complete flows through the API from worker threads:
+borrow (creates a checkout session), payment success callback (retrieves
+it) and return. Stripe latency and error rate are injected by the fake,
+so the numbers show how the flow behaves with a slow or flaky Stripe.
+Run it against PostgreSQL; SQLite serializes all writers.
+
+    python benchmarks/payment_flow.py --threads 8 --latency 0.3
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import stripe  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from library_service_api.models import Book, Payment  # noqa: E402
+from library_service_api.services.fake_stripe import (  # noqa: E402
+    FakeStripeServer
+)
+
+
+def flow(client, book):
+    """One borrow, payment and return, returns the failed step or None"""
+    res = client.post(reverse("library_service_api:borrowings-list"), {
+        "book_id": book.id,
+        "expected_return_date": (date.today() + timedelta(days=3)).isoformat()
+    }, format="json")
+    if res.status_code != 201:
+        return f"borrow {res.status_code}"
+    borrowing_id = res.data["id"]
+
+    session_id = Payment.objects.filter(
+        borrowing_id=borrowing_id
+    ).values_list("session_id", flat=True).first()
+    res = client.get(
+        reverse("library_service_api:payments-success"),
+        {"session_id": session_id}
+    )
+    if res.status_code != 200:
+        return f"success {res.status_code}"
+
+    res = client.post(reverse(
+        "library_service_api:borrowings-return", args=[borrowing_id]
+    ))
+    if res.status_code != 200:
+        return f"return {res.status_code}"
+    return None
+
+
+def worker(user, book, deadline, durations, failures, lock):
+    client = APIClient(SERVER_NAME="localhost")
+    client.force_authenticate(user=user)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        failed = flow(client, book)
+        elapsed = time.perf_counter() - started
+        with lock:
+            if failed:
+                failures[failed] += 1
+            else:
+                durations.append(elapsed)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeStripeServer(
+        latency=args.latency, error_rate=args.error_rate
+    )
+    stripe.api_base = server.start()
+    stripe.api_key = "sk_fake"
+
+    user = get_user_model().objects.create_user(
+        email="payment-benchmark@example.com", password="benchmark"
+    )
+    book = Book.objects.create(
+        title="Payment benchmark",
+        author="Benchmark",
+        daily_fee=Decimal("1.00"),
+        inventory=args.threads,
+    )
+    durations, failures, lock = [], Counter(), threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    pool = [
+        threading.Thread(
+            target=worker,
+            args=(user, book, deadline, durations, failures, lock)
+        )
+        for _ in range(args.threads)
+    ]
+    try:
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+    finally:
+        book.delete()
+        user.delete()
+        server.stop()
+
+    print(f"{connection.vendor}, {args.threads} threads, Stripe latency "
+          f"{args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}")
+    print(f"flows/s: {len(durations) / args.seconds:.1f}")
+    if durations:
+        quantiles = statistics.quantiles(durations, n=100)
+        print(f"p50: {quantiles[49] * 1000:.0f} ms, "
+              f"p95: {quantiles[94] * 1000:.0f} ms")
+    for step, count in failures.most_common():
+        print(f"failed at {step}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Borrow/return throughput and correctness on SQLite with several workers.
+
+Forks worker processes (like gunicorn workers) that borrow and return
+copies of one title in a loop, each in its own transaction, against a
+fresh database file per mode:
+
+- default: Django's stock SQLite connection (rollback journal,
+  deferred transactions, 5 s busy timeout)
+- tuned: the OPTIONS from settings (WAL, synchronous=NORMAL, mmap,
+  BEGIN IMMEDIATE, busy timeout)
+
+Reports operations per second, "database is locked" failures and
+whether the stock still adds up afterwards.
+
+    python benchmarks/sqlite_concurrency.py --workers 4 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import OperationalError, connection, transaction  # noqa: E402
+
+from library_service_api.models import Book, Borrowing  # noqa: E402
+from library_service_api.services.inventory_service import (  # noqa: E402
+    put_copy,
+    take_copy
+)
+
+MODES = {
+    "default": {},
+    "tuned": settings.DATABASES["default"].get("OPTIONS", {}),
+}
+
+
+def use_database(path, options):
+    connection.close()
+    connection.settings_dict["NAME"] = path
+    connection.settings_dict["OPTIONS"] = dict(options)
+
+
+def worker(path, options, book_id, user_id, deadline, results):
+    use_database(path, options)
+    book = Book.objects.get(id=book_id)
+    done = locked = 0
+    while time.monotonic() < deadline:
+        try:
+            with transaction.atomic():
+                if not take_copy(book):
+                    continue
+                borrowing = Borrowing.objects.create(
+                    expected_return_date=date.today(),
+                    book_id=book_id,
+                    user_id=user_id,
+                )
+            with transaction.atomic():
+                Borrowing.objects.filter(pk=borrowing.pk).update(
+                    actual_return_date=date.today()
+                )
+                put_copy(book)
+            done += 1
+        except OperationalError as error:
+            if "locked" not in str(error):
+                raise
+            locked += 1
+    connection.close()
+    results.put((done, locked))
+
+
+def run(path, mode, workers, seconds, copies):
+    use_database(path, MODES[mode])
+    call_command("migrate", verbosity=0)
+    user = get_user_model().objects.create_user(
+        email="sqlite-benchmark@example.com", password="benchmark"
+    )
+    book = Book.objects.create(
+        title="SQLite benchmark",
+        author="Benchmark",
+        daily_fee=Decimal("1.00"),
+        inventory=copies,
+    )
+    connection.close()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    deadline = time.monotonic() + seconds
+    pool = [
+        context.Process(
+            target=worker,
+            args=(path, MODES[mode], book.id, user.id, deadline, results)
+        )
+        for _ in range(workers)
+    ]
+    for process in pool:
+        process.start()
+    totals = [results.get() for _ in pool]
+    for process in pool:
+        process.join()
+
+    use_database(path, MODES[mode])
+    book.refresh_from_db()
+    on_loan = Borrowing.objects.filter(actual_return_date__isnull=True)
+    consistent = book.inventory + on_loan.count() == copies
+    connection.close()
+    return (
+        sum(done for done, _ in totals) / seconds,
+        sum(locked for _, locked in totals),
+        consistent,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument(
+        "--modes", nargs="+", choices=MODES, default=list(MODES)
+    )
+    args = parser.parse_args()
+
+    if connection.vendor != "sqlite":
+        parser.error("set DATABASE_ENGINE=sqlite3 to run this benchmark")
+
+    print(f"{args.workers} worker processes, {args.copies} copies")
+    print(f"{'mode':>8} {'borrow+return/s':>16} {'locked':>8} "
+          f"{'stock ok':>9}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as directory:
+            rate, locked, consistent = run(
+                os.path.join(directory, f"{mode}.sqlite3"),
+                mode,
+                args.workers,
+                args.seconds,
+                args.copies
+            )
+        print(f"{mode:>8} {rate:>16.1f} {locked:>8} {str(consistent):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Build time, memory and lookup latency of the typeahead index.
+
+Builds the in-process prefix index behind /books/suggest/ from synthetic
+titles and authors (no database needed) and times lookups for prefixes
+of one to a few characters, the worst case being the shortest ones.
+
+    python benchmarks/typeahead.py --books 1000000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import resource
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from library_service_api.services.suggest_service import (  # noqa: E402
+    PrefixIndex
+)
+
+
+def word(rng):
+    return "".join(
+        rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))
+    ).capitalize()
+
+
+def rows(count, seed=42):
+    rng = random.Random(seed)
+    for book_id in range(1, count + 1):
+        title = " ".join(word(rng) for _ in range(rng.randint(1, 5)))
+        author = f"{word(rng)} {word(rng)}"
+        yield book_id, title, author
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    catalog = list(rows(args.books))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index = PrefixIndex(catalog)
+    build = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; approximate, includes sort temporaries
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print(f"{len(index)} books indexed in {build:.1f}s, "
+          f"~{grown / 1024:.0f} MiB")
+
+    rng = random.Random(7)
+    print(f"{'prefix':>8} {'µs/lookup':>10}")
+    for length in (1, 2, 3, 5):
+        prefixes = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+            for _ in range(args.lookups)
+        ]
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix)
+        elapsed = time.perf_counter() - started
+        print(f"{length:>8} {elapsed / args.lookups * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+bind = "0.0.0.0:8080"
+
+# Threaded workers: the login hashing limit (AUTH_HASHING_CONCURRENCY
+# slots plus AUTH_HASHING_QUEUE waiters per process) only leaves room
+# for catalog requests when a process serves several requests at once
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+_auth_threads = (
+    int(os.getenv("AUTH_HASHING_CONCURRENCY", 2))
+    + int(os.getenv("AUTH_HASHING_QUEUE", 2))
+)
+if threads <= _auth_threads:
+    raise RuntimeError(
+        f"GUNICORN_THREADS ({threads}) must exceed AUTH_HASHING_CONCURRENCY "
+        f"+ AUTH_HASHING_QUEUE ({_auth_threads}), or logins can hold "
+        f"every thread"
+    )
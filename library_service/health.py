@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.utils import DatabaseError
+from django.http import JsonResponse
+
+from library_service_api.models import BOOT_DURATION_CHECKPOINT, JobCheckpoint
+
+# Per-process result of the last readiness check: (checked_at, payload)
+_last_check = None
+
+
+def healthz(request):
+    """Liveness: the process answers, no dependencies are touched"""
+    return JsonResponse({"status": "ok"})
+
+
+def _check_database():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        boot_seconds = JobCheckpoint.get_value(BOOT_DURATION_CHECKPOINT)
+    except DatabaseError as error:
+        return {"status": "unavailable", "database": str(error)}
+    return {
+        "status": "ok",
+        "database": "ok",
+        "boot_seconds": float(boot_seconds) if boot_seconds else None,
+    }
+
+
+def readyz(request):
+    """
+    Readiness: the database answers.
+
+    The result is reused for READINESS_CHECK_INTERVAL seconds, so frequent
+    probes cost one query per interval per worker.
+    """
+    global _last_check
+    checked_now = time.monotonic()
+    if (
+        _last_check is None
+        or checked_now - _last_check[0] > settings.READINESS_CHECK_INTERVAL
+    ):
+        _last_check = (checked_now, _check_database())
+
+    payload = _last_check[1]
+    return JsonResponse(
+        payload,
+        status=200 if payload["status"] == "ok" else 503
+    )
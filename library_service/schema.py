@@ -0,0 +1,131 @@
+import functools
+import gzip
+import hashlib
+import re
+from pathlib import Path
+
+import drf_spectacular
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.renderers import (OpenApiJsonRenderer,
+                                       OpenApiYamlRenderer)
+from drf_spectacular.views import SpectacularAPIView
+
+# (code version, api version, language, media type) -> CachedSchema
+_schemas = {}
+
+SCHEMA_RENDERERS = (OpenApiYamlRenderer, OpenApiJsonRenderer)
+# Packages whose source the schema is generated from
+SOURCE_PACKAGES = (
+    "library_service",
+    "library_service_api",
+    "library_service_users",
+)
+
+
+class CachedSchema:
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, mtime=0)
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+@functools.cache
+def _source_hash():
+    digest = hashlib.sha1(drf_spectacular.__version__.encode())
+    base = Path(settings.BASE_DIR)
+    for package in SOURCE_PACKAGES:
+        for path in sorted((base / package).rglob("*.py")):
+            digest.update(path.relative_to(base).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def code_version():
+    """
+    CODE_VERSION when set, else a hash of the source.
+
+    The hash changes with any code edit, so a schema prebuilt for other
+    code (a stale file in a checkout, an image with a mounted source
+    tree) is never served.
+    """
+    return settings.CODE_VERSION or _source_hash()
+
+
+def schema_file(schema_format):
+    """Location of the prebuilt schema for the current code version"""
+    return (
+        Path(settings.SCHEMA_CACHE_DIR)
+        / f"schema-{code_version()}.{schema_format}"
+    )
+
+
+def _accepts_gzip(request):
+    accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    return re.search(r"\bgzip\b", accept_encoding) is not None
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serve the OpenAPI schema from memory.
+
+    The schema is generated once per process and code version, or read
+    from the file written by `manage.py build_schema` for this version.
+    Responses carry an ETag and are gzipped for clients that accept it.
+    """
+
+    def _get_schema_response(self, request):
+        version = (
+            self.api_version
+            or request.version
+            or self._get_version_parameter(request)
+        )
+        renderer = request.accepted_renderer
+        key = (
+            code_version(),
+            version,
+            translation.get_language(),
+            renderer.media_type,
+        )
+        schema = _schemas.get(key)
+        if schema is None:
+            schema = self._load_schema(request, version, renderer)
+            _schemas[key] = schema
+
+        if request.META.get("HTTP_IF_NONE_MATCH") == schema.etag:
+            response = HttpResponseNotModified()
+        elif _accepts_gzip(request):
+            response = HttpResponse(
+                schema.gzipped,
+                content_type=renderer.media_type
+            )
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(
+                schema.body,
+                content_type=renderer.media_type
+            )
+        response["ETag"] = schema.etag
+        response["Content-Disposition"] = (
+            f'inline; filename="{self._get_filename(request, version)}"'
+        )
+        patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+        return response
+
+    def _load_schema(self, request, version, renderer):
+        if not version and not request.GET.get("lang"):
+            path = schema_file(renderer.format)
+            if path.exists():
+                return CachedSchema(path.read_bytes())
+
+        generator = self.generator_class(
+            urlconf=self.urlconf,
+            api_version=version,
+            patterns=self.patterns
+        )
+        data = generator.get_schema(request=request, public=self.serve_public)
+        return CachedSchema(
+            renderer.render(data, renderer_context=self.get_renderer_context())
+        )
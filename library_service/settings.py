@@ -33,10 +33,53 @@ DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# Notifications within this many seconds are sent as one digest message
+TELEGRAM_DIGEST_WINDOW = float(os.getenv("TELEGRAM_DIGEST_WINDOW", 10))
+# Telegram allows about 20 messages per minute to the same group chat
+TELEGRAM_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_RATE_PER_MINUTE", 20))
+TELEGRAM_RATE_BURST = int(os.getenv("TELEGRAM_RATE_BURST", 3))
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 
 stripe.api_key = STRIPE_SECRET_KEY
+# Point the stripe library somewhere else, e.g. the bundled fake server
+# (python manage.py run_fake_stripe) for load tests
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+if STRIPE_API_BASE:
+    stripe.api_base = STRIPE_API_BASE
+
+# Stripe client: per-call timeout (s), retries and the total time budget (s)
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", 5))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 2))
+STRIPE_RETRY_BACKOFF = float(os.getenv("STRIPE_RETRY_BACKOFF", 0.2))
+STRIPE_TIMEOUT_BUDGET = float(os.getenv("STRIPE_TIMEOUT_BUDGET", 12))
+# Circuit breaker: open after N failures within the window (s)
+STRIPE_BREAKER_FAILURE_THRESHOLD = int(
+    os.getenv("STRIPE_BREAKER_FAILURE_THRESHOLD", 5)
+)
+STRIPE_BREAKER_WINDOW = int(os.getenv("STRIPE_BREAKER_WINDOW", 60))
+STRIPE_BREAKER_RESET_TIMEOUT = int(
+    os.getenv("STRIPE_BREAKER_RESET_TIMEOUT", 30)
+)
+
+# Returned and settled borrowings older than this are moved to the archive
+BORROWING_ARCHIVE_AFTER_DAYS = int(
+    os.getenv("BORROWING_ARCHIVE_AFTER_DAYS", 365)
+)
+
+# A borrow counts half as much towards "trending" after this many hours
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 72))
+
+# How long a stored response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+)
+# How long a key stays claimed by a request that never stored a response
+# (its worker died); keep it above the gunicorn worker timeout
+IDEMPOTENCY_CLAIM_LEASE = timedelta(
+    seconds=int(os.getenv("IDEMPOTENCY_CLAIM_LEASE_SECONDS", 60))
+)
 
 ALLOWED_HOSTS = os.environ.get(
     "ALLOWED_HOSTS",
@@ -53,6 +96,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'drf_spectacular',
     'drf_spectacular_sidecar',
     'library_service_api',
@@ -61,6 +105,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'library_service_api.slow_queries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,6 +114,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in slow query log: statements slower than this many milliseconds
+# are recorded in SlowQuery (0 disables it), with an EXPLAIN plan for a
+# sample of them; `manage.py slow_queries` lists the worst
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 0))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1)
+)
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", 500))
+
 ROOT_URLCONF = 'library_service.urls'
 
 TEMPLATES = [
@@ -105,12 +159,77 @@ DATABASES = {
      }
 }
 
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    # SQLite in production: WAL lets readers run next to the writer,
+    # BEGIN IMMEDIATE takes the write lock when a transaction starts (so
+    # it replaces select_for_update(), a no-op here, and avoids deadlocked
+    # lock upgrades), and writers wait for the lock instead of failing
+    # with "database is locked".
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size={};'
+            'PRAGMA temp_store=MEMORY;'
+        ).format(int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+    }
+
+
+# Cache
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache)
+# in production so that state like the Stripe circuit breaker is shared
+# between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
+# Seconds a /readyz database check result is reused by a worker
+READINESS_CHECK_INTERVAL = float(os.getenv("READINESS_CHECK_INTERVAL", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
 AUTH_USER_MODEL = 'library_service_users.Customer'
 
+# "pbkdf2" (default) or "argon2" (memory-hard, needs argon2-cffi).
+# The first hasher hashes new passwords; the others only verify old
+# hashes, which are rehashed with the first one on the next login.
+PASSWORD_HASHING_POLICY = os.getenv("PASSWORD_HASHING_POLICY", "pbkdf2")
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.getenv("PASSWORD_PBKDF2_ITERATIONS", 1_000_000)
+)
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", 2))
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.getenv("PASSWORD_ARGON2_MEMORY_COST", 102400)
+)
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", 8))
+
+PASSWORD_HASHERS = [
+    'library_service_users.hashers.TunedPBKDF2PasswordHasher',
+    'library_service_users.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if PASSWORD_HASHING_POLICY == "argon2":
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
+# Concurrent password hashing requests per worker process (login/register)
+# and how many more may wait for a slot; together they must stay below
+# the gunicorn threads per worker (gunicorn.conf.py)
+AUTH_HASHING_CONCURRENCY = int(os.getenv("AUTH_HASHING_CONCURRENCY", 2))
+AUTH_HASHING_QUEUE = int(os.getenv("AUTH_HASHING_QUEUE", 2))
+AUTH_HASHING_TIMEOUT = float(os.getenv("AUTH_HASHING_TIMEOUT", 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -162,10 +281,20 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_FILTER_BACKENDS": [
+        "django_filters.rest_framework.DjangoFilterBackend",
+    ],
+    "DEFAULT_PAGINATION_CLASS": (
+        "library_service_api.pagination.EstimatedCountLimitOffsetPagination"
+    ),
     "PAGE_SIZE": 10,
 }
 
+# Paginated results estimated above this many rows get an approximate count
+EXACT_COUNT_THRESHOLD = int(os.getenv("EXACT_COUNT_THRESHOLD", 10000))
+# Seconds a large exact count is reused where no planner estimate exists
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 60))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Library Service API',
     'DESCRIPTION': 'Books borrowing management system',
@@ -173,6 +302,12 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# Identifies the deployed code (e.g. its git SHA); /api/schema/ serves the
+# schema prebuilt for it by `manage.py build_schema`. Unset, the version is
+# a hash of the source (library_service.schema.code_version)
+CODE_VERSION = os.getenv("CODE_VERSION")
+SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", BASE_DIR / "schema_cache")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60 * 60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
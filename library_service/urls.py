@@ -17,11 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.conf.urls.static import static
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
 
 from library_service import settings
+from library_service.health import healthz, readyz
+from library_service.schema import CachedSpectacularAPIView
 
 urlpatterns = [
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('admin/', admin.site.urls),
     path(
         'api/users/',
@@ -39,7 +43,7 @@ urlpatterns = [
     ),
     path(
         'api/schema/',
-        SpectacularAPIView.as_view(),
+        CachedSpectacularAPIView.as_view(),
         name='schema'
     ),
     path(
@@ -1,8 +1,72 @@
 from django.contrib import admin
 
 from library_service_api.models import Book, Borrowing, Payment
+from library_service_api.pagination import EstimatedCountPaginator
+from library_service_api.services.inventory_service import set_inventory
 
-# Register your models here.
-admin.site.register(Book)
-admin.site.register(Borrowing)
-admin.site.register(Payment)
+
+@admin.register(Book)
+class BookAdmin(admin.ModelAdmin):
+    list_display = (
+        "title",
+        "author",
+        "cover",
+        "daily_fee",
+        "inventory",
+        "total_copies",
+    )
+    list_filter = ("cover",)
+    # Prefix lookups can use the title/author indexes, unlike icontains
+    search_fields = ("title__startswith", "author__startswith")
+    readonly_fields = ("total_copies",)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+        if "inventory" in form.changed_data:
+            # Moves total_copies by the copies added or removed
+            set_inventory(obj, obj.inventory)
+        # Like BookSerializer.update, leave the counters to their writers
+        obj.save(update_fields=[
+            name for name in form.changed_data if name != "inventory"
+        ])
+
+
+@admin.register(Borrowing)
+class BorrowingAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "user",
+        "book",
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+    )
+    list_select_related = ("user", "book")
+    list_filter = (
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+    )
+    search_fields = ("user__email__exact", "book__title__startswith")
+    autocomplete_fields = ("user", "book")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "borrowing_id",
+        "type",
+        "status",
+        "money_to_pay",
+        "session_id",
+    )
+    list_filter = ("status", "type")
+    search_fields = ("session_id__exact", "borrowing__user__email__exact")
+    raw_id_fields = ("borrowing",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
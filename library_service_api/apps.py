@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LibraryServiceApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library_service_api'
+
+    def ready(self):
+        from library_service_api import signals  # noqa: F401
@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class DaysBetween(models.Func):
+    """
+    Whole days from `start` to `end` (end - start) for two date
+    expressions, in the database's own date arithmetic.
+    """
+
+    output_field = models.IntegerField()
+    arity = 2
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # Subtracting dates gives the number of days on PostgreSQL
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(%(expressions)s)",
+            arg_joiner=" - ",
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            function="DATEDIFF",
+            **extra_context
+        )
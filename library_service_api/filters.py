@@ -0,0 +1,70 @@
+from django.db.models import Q
+from django.utils.timezone import now
+from django_filters import rest_framework as filters
+
+from library_service_api.models import (ArchivedBorrowing,
+                                        ArchivedPayment,
+                                        Borrowing,
+                                        Payment)
+
+
+class BorrowingFilter(filters.FilterSet):
+    """
+    Query params of the borrowing list.
+
+    Every filter, alone or combined with the per-user restriction for
+    non-admins, has an index to use (see Borrowing.Meta.indexes):
+    user or book with a borrow date range read (user|book, borrow_date),
+    overdue reads the partial index on active borrowings' due date.
+    Date ranges take `<field>_after` / `<field>_before` (inclusive).
+    """
+
+    user_id = filters.NumberFilter(method="filter_user_id")
+    book = filters.NumberFilter(field_name="book_id")
+    borrow_date = filters.DateFromToRangeFilter()
+    expected_return_date = filters.DateFromToRangeFilter()
+    actual_return_date = filters.DateFromToRangeFilter()
+    is_active = filters.BooleanFilter(
+        field_name="actual_return_date", lookup_expr="isnull"
+    )
+    overdue = filters.BooleanFilter(method="filter_overdue")
+
+    class Meta:
+        model = Borrowing
+        fields = []
+
+    def filter_user_id(self, queryset, name, value):
+        # Other users' borrowings are admin only; customers already see
+        # just their own
+        if self.request is None or not self.request.user.is_staff:
+            return queryset
+        return queryset.filter(user_id=value)
+
+    def filter_overdue(self, queryset, name, value):
+        overdue = Q(
+            actual_return_date__isnull=True,
+            expected_return_date__lt=now().date()
+        )
+        return queryset.filter(overdue) if value else queryset.exclude(overdue)
+
+
+class ArchivedBorrowingFilter(BorrowingFilter):
+    class Meta(BorrowingFilter.Meta):
+        model = ArchivedBorrowing
+
+
+class PaymentFilter(filters.FilterSet):
+    """Query params of the payment list, backed by (status, type)"""
+
+    status = filters.ChoiceFilter(choices=Payment.StatusChoices.choices)
+    type = filters.ChoiceFilter(choices=Payment.TypeChoices.choices)
+    borrowing = filters.NumberFilter(field_name="borrowing_id")
+
+    class Meta:
+        model = Payment
+        fields = []
+
+
+class ArchivedPaymentFilter(PaymentFilter):
+    class Meta(PaymentFilter.Meta):
+        model = ArchivedPayment
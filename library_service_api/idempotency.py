@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from library_service_api.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+CLAIM_ATTEMPTS = 5
+
+
+def _request_fingerprint(request):
+    """Hash everything that makes two requests "the same" request."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    raw = f"{request.method}:{request.path}:{body}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _expiry_threshold():
+    return now() - settings.IDEMPOTENCY_KEY_TTL
+
+
+def purge_expired_keys():
+    """Delete stored responses older than IDEMPOTENCY_KEY_TTL"""
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=_expiry_threshold()
+    ).delete()
+    return deleted
+
+
+class IdempotencyKeyContended(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        f"A request with this {IDEMPOTENCY_HEADER} is being processed, "
+        f"retry later."
+    )
+    default_code = "idempotency_key_contended"
+
+
+def _is_live(record):
+    """Whether a row still holds its key: replayable or claimed"""
+    if record.is_completed:
+        return record.created_at >= _expiry_threshold()
+    return record.created_at >= now() - settings.IDEMPOTENCY_CLAIM_LEASE
+
+
+def _claim_key(user, key, fingerprint):
+    """
+    Insert a placeholder row for the key.
+
+    The unique constraint makes the insert the synchronisation point
+    between workers: exactly one request wins the claim, every other
+    one gets the existing row back. An expired row, or a placeholder
+    older than IDEMPOTENCY_CLAIM_LEASE (its worker died before storing
+    a response), is deleted and the claim retried; if other workers keep
+    replacing the row for CLAIM_ATTEMPTS rounds the request gets a 409.
+    Returns (record, claimed).
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    request_fingerprint=fingerprint,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(
+                user=user, key=key
+            ).first()
+            if record is None:
+                continue
+            if _is_live(record):
+                return record, False
+            IdempotencyKey.objects.filter(
+                pk=record.pk,
+                created_at=record.created_at
+            ).delete()
+    raise IdempotencyKeyContended()
+
+
+def idempotent(view_method):
+    """
+    Make a POST viewset action safe to retry.
+
+    When the client sends an Idempotency-Key header, the first response
+    is stored and replayed for every retry with the same key, so the
+    inventory lock, Stripe session and Telegram message happen once.
+    Requests without the header are processed as usual.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} is too long."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = _request_fingerprint(request)
+        record, claimed = _claim_key(request.user, key, fingerprint)
+
+        if not claimed:
+            if record.request_fingerprint != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} was already used "
+                               f"for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if not record.is_completed:
+                return Response(
+                    {"detail": f"A request with this {IDEMPOTENCY_HEADER} "
+                               f"is already being processed."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(
+                record.response_body,
+                status=record.status_code,
+                headers={REPLAYED_HEADER: "true"}
+            )
+
+        # By pk: if this request outlived its lease, the key may belong
+        # to another row by now, which is left alone
+        claim = IdempotencyKey.objects.filter(pk=record.pk)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code >= 500:
+            # Server errors are not a final answer, let the client retry
+            claim.delete()
+            return response
+
+        claim.update(
+            status_code=response.status_code,
+            response_body=response.data
+        )
+        return response
+
+    return wrapper
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library_service_api.services.archive_service import (archive_batch,
+                                                          archive_horizon)
+
+
+class Command(BaseCommand):
+    help = ("Moves returned and settled borrowings (with their payments) "
+            "older than the horizon into the archive tables")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.BORROWING_ARCHIVE_AFTER_DAYS,
+            help="Archive borrowings returned more than N days ago",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after N batches; the next run resumes",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches to spare live traffic",
+        )
+
+    def handle(self, *args, **options):
+        horizon = archive_horizon(options["older_than_days"])
+        started = time.monotonic()
+        batches = total = 0
+        while options["max_batches"] is None or (
+            batches < options["max_batches"]
+        ):
+            moved = archive_batch(horizon, options["batch_size"])
+            if not moved:
+                break
+            batches += 1
+            total += moved
+            self.stdout.write(f"Batch {batches}: archived {moved}")
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} borrowings returned before {horizon} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,92 @@
+import hashlib
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from library_service_api.models import BOOT_DURATION_CHECKPOINT, JobCheckpoint
+
+
+def fixture_checkpoint(path):
+    return f"boot:fixture:{path.name}"
+
+
+class Command(BaseCommand):
+    help = ("Prepares the container to serve traffic, skipping work "
+            "that was already done by a previous boot")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fixture",
+            action="append",
+            default=[],
+            help="Fixture to load when its content changed (repeatable)",
+        )
+        parser.add_argument(
+            "--skip-static",
+            action="store_true",
+            help="Do not run collectstatic",
+        )
+        parser.add_argument("--db-timeout", type=float, default=60)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.timings = []
+
+        self._step(
+            "wait_for_db",
+            lambda: call_command(
+                "wait_for_db",
+                timeout=options["db_timeout"],
+                stdout=self.stdout
+            )
+        )
+        self._step("migrate", self._migrate)
+        if not options["skip_static"]:
+            self._step(
+                "collectstatic",
+                lambda: call_command(
+                    "collectstatic",
+                    interactive=False,
+                    verbosity=0
+                )
+            )
+        for fixture in options["fixture"]:
+            self._step(
+                f"loaddata {fixture}",
+                lambda: self._load_fixture(Path(fixture))
+            )
+
+        total = time.monotonic() - started
+        JobCheckpoint.set_value(BOOT_DURATION_CHECKPOINT, f"{total:.3f}")
+        for name, seconds, result in self.timings:
+            self.stdout.write(f"{name:<30} {seconds:>8.3f}s  {result}")
+        self.stdout.write(self.style.SUCCESS(f"Ready in {total:.3f}s"))
+
+    def _step(self, name, func):
+        started = time.monotonic()
+        result = func() or "done"
+        self.timings.append((name, time.monotonic() - started, result))
+
+    def _migrate(self):
+        connection = connections["default"]
+        executor = MigrationExecutor(connection)
+        targets = executor.loader.graph.leaf_nodes()
+        if not executor.migration_plan(targets):
+            return "skipped, up to date"
+        call_command("migrate", interactive=False, verbosity=0)
+        return "applied"
+
+    def _load_fixture(self, path):
+        if not path.exists():
+            raise CommandError(f"Fixture {path} does not exist")
+        checksum = hashlib.sha256(path.read_bytes()).hexdigest()
+        name = fixture_checkpoint(path)
+        if JobCheckpoint.get_value(name) == checksum:
+            return "skipped, unchanged"
+        call_command("loaddata", str(path), verbosity=0)
+        JobCheckpoint.set_value(name, checksum)
+        return "loaded"
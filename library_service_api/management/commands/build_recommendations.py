@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library_service_api.services.recommendation_service import (
+    build_neighbors
+)
+
+
+class Command(BaseCommand):
+    help = ("Builds the \"readers also borrowed\" lists from the "
+            "borrowing history")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only refresh books affected by borrowings since last run",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        refreshed = build_neighbors(
+            top_k=options["top_k"],
+            incremental=options["incremental"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed recommendations for {refreshed} books "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
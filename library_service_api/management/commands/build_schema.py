@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from drf_spectacular.settings import spectacular_settings
+
+from library_service.schema import SCHEMA_RENDERERS, schema_file
+
+
+class Command(BaseCommand):
+    help = ("Generates the OpenAPI schema for the current code version so "
+            "that /api/schema/ does not have to introspect the API at "
+            "runtime")
+
+    def handle(self, *args, **options):
+        generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+        schema = generator.get_schema(
+            request=None,
+            public=spectacular_settings.SERVE_PUBLIC
+        )
+        Path(settings.SCHEMA_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+        for renderer_class in SCHEMA_RENDERERS:
+            path = schema_file(renderer_class.format)
+            path.write_bytes(
+                renderer_class().render(schema, renderer_context={})
+            )
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library_service_api.services.inventory_service import (
+    find_drift,
+    repair_drift
+)
+
+
+class Command(BaseCommand):
+    help = ("Checks that every book's available stock equals its total "
+            "copies minus the copies on loan, and optionally repairs it")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Set drifted stock back to total copies minus copies on loan",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--show",
+            type=int,
+            default=20,
+            help="Drifted books to list (0 for none)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        drifted = []
+        for book in find_drift().iterator(chunk_size=2000):
+            if len(drifted) < options["show"]:
+                self.stdout.write(
+                    f"{book.id} {book.title}: {book.available_inventory} "
+                    f"available, expected {book.expected} "
+                    f"({book.total_copies} total, {book.on_loan} on loan)"
+                )
+            drifted.append(book.id)
+        self.stdout.write(
+            f"{len(drifted)} books drifted "
+            f"(checked in {time.monotonic() - started:.1f}s)"
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Inventory is consistent"))
+            return
+        if not options["repair"]:
+            raise CommandError(
+                f"{len(drifted)} books drifted, run with --repair to fix"
+            )
+
+        repaired, unrepairable = repair_drift(
+            drifted, batch_size=options["batch_size"]
+        )
+        if unrepairable:
+            self.stderr.write(self.style.WARNING(
+                f"{len(unrepairable)} books have fewer total copies than "
+                f"copies on loan; fix their totals by hand: "
+                f"{', '.join(map(str, unrepairable[:20]))}"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {repaired} books in "
+            f"{time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from library_service_api.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes stored Idempotency-Key responses past their TTL"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys")
+        )
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library_service_api.services.reporting_service import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the daily circulation and payment rollups "
+            "from the borrowing and payment tables (live and archived)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        circulation, payments = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {circulation} circulation and {payments} payment "
+            f"rollup rows in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from library_service_api.services.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = ("Runs a local fake of the Stripe Checkout Session API "
+            "(use with STRIPE_API_BASE)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Mean delay added to every request, in seconds",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Share of requests answered with a 500 (0-1)",
+        )
+        parser.add_argument(
+            "--paid-rate",
+            type=float,
+            default=1.0,
+            help="Share of checkout sessions that end up paid (0-1)",
+        )
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            paid_rate=options["paid_rate"],
+            verbose=options["verbose"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Stripe listening on {server.url}, "
+            f"set STRIPE_API_BASE={server.url}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
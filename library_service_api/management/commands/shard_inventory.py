@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library_service_api.models import Book
+from library_service_api.services.inventory_service import set_shards
+
+
+class Command(BaseCommand):
+    help = ("Spreads the inventory of a book over N counter slots "
+            "(0 folds it back into Book.inventory)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("book_id", type=int)
+        parser.add_argument("shards", type=int)
+
+    def handle(self, *args, **options):
+        if options["shards"] < 0:
+            raise CommandError("shards must be 0 or greater")
+        try:
+            book = Book.objects.get(id=options["book_id"])
+        except Book.DoesNotExist:
+            raise CommandError(f"Book {options['book_id']} does not exist")
+
+        book = set_shards(book, options["shards"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{book} now uses {book.inventory_shards} inventory shards"
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from library_service_api.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = "Lists the recorded slow queries by total time spent"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Also print the captured EXPLAIN plans",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Delete all recorded slow queries",
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f"Deleted {deleted} slow queries")
+            return
+
+        offenders = SlowQuery.objects.order_by("-total_ms")[
+            :options["limit"]
+        ]
+        for rank, query in enumerate(offenders, start=1):
+            self.stdout.write(self.style.WARNING(
+                f"{rank}. {query.total_ms:.0f} ms total, {query.calls} calls, "
+                f"{query.total_ms / query.calls:.1f} ms avg, "
+                f"{query.max_ms:.1f} ms max — {query.view}"
+            ))
+            self.stdout.write(f"   {query.sql}")
+            if options["plans"] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f"     {line}")
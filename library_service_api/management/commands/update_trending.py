@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from library_service_api.services.trending_service import (
+    rebuild,
+    renormalize
+)
+
+
+class Command(BaseCommand):
+    help = "Renormalizes trending scores to the current time"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute scores from the borrowing history instead "
+                 "(backfill, or after changing TRENDING_HALF_LIFE_HOURS)",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            books = rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt trending scores for {books} books"
+            ))
+            return
+        scale = renormalize()
+        self.stdout.write(self.style.SUCCESS(
+            f"Renormalized trending scores (scale {scale:.6g})"
+        ))
@@ -1,20 +1,49 @@
 import time
-from django.core.management.base import BaseCommand
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
 from django.db.utils import OperationalError
 
 
 class Command(BaseCommand):
-    help_message = "Blocks until database is available"
+    help = "Blocks until database is available"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Give up after this many seconds",
+        )
+        parser.add_argument(
+            "--max-delay",
+            type=float,
+            default=5,
+            help="Upper bound for the delay between attempts",
+        )
 
     def handle(self, *args, **options):
         self.stdout.write("Waiting for database...")
-        db_conn = None
-        while db_conn is None:
+        started = time.monotonic()
+        deadline = started + options["timeout"]
+        delay = 0.05
+        while True:
             try:
-                connections["default"].cursor()
-                db_conn = True
+                connections["default"].ensure_connection()
+                break
             except OperationalError:
-                self.stdout.write("Database unavailable, waiting 1 second...")
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS("Database available!"))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database unavailable after "
+                        f"{options['timeout']:.0f} seconds"
+                    )
+                delay = min(delay * 2, options["max_delay"], remaining)
+                self.stdout.write(
+                    f"Database unavailable, waiting {delay:.2f} seconds..."
+                )
+                time.sleep(delay)
+        self.stdout.write(self.style.SUCCESS(
+            f"Database available after "
+            f"{time.monotonic() - started:.2f} seconds!"
+        ))
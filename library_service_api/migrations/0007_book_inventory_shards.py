@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='inventory_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='BookInventorySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_slots', to='library_service_api.book')),
+            ],
+            options={
+                'ordering': ['book', 'slot'],
+                'constraints': [models.UniqueConstraint(fields=('book', 'slot'), name='unique_inventory_slot_per_book')],
+            },
+        ),
+    ]
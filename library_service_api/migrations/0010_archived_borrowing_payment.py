@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0009_jobcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrowing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateField()),
+                ('expected_return_date', models.DateField()),
+                ('actual_return_date', models.DateField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrowings', to='library_service_api.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrowings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-borrow_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid'), ('EXPIRED', 'Expired')], max_length=8)),
+                ('type', models.CharField(choices=[('PAYMENT', 'Payment'), ('FINE', 'Fine')], max_length=7)),
+                ('session_url', models.URLField(max_length=500)),
+                ('session_id', models.CharField(max_length=255, unique=True)),
+                ('money_to_pay', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('borrowing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='library_service_api.archivedborrowing')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedborrowing',
+            index=models.Index(fields=['user', 'borrow_date'], name='library_ser_user_id_8c26b2_idx'),
+        ),
+    ]
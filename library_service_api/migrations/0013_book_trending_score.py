@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0012_bookneighbor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-trending_score'], name='library_ser_trendin_307193_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0014_slowquery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True)), fields=['expected_return_date'], name='borrowing_active_due_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0015_borrowing_active_due_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='borrowing',
+            name='library_ser_actual__f92ebb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='library_ser_status_920262_idx',
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', False)), fields=['actual_return_date'], name='borrowing_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['user', '-borrow_date'], name='borrowing_user_borrow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['book', '-borrow_date'], name='borrowing_book_borrow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'type'], name='payment_status_type_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:32
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_copies(apps, schema_editor):
+    """Start every total at what is on the shelf plus what is on loan"""
+    Book = apps.get_model("library_service_api", "Book")
+    Borrowing = apps.get_model("library_service_api", "Borrowing")
+    BookInventorySlot = apps.get_model(
+        "library_service_api", "BookInventorySlot"
+    )
+    on_loan = (
+        Borrowing.objects.filter(
+            book=models.OuterRef("pk"),
+            actual_return_date__isnull=True
+        )
+        .values("book")
+        .annotate(total=models.Count("id"))
+        .values("total")
+    )
+    in_slots = (
+        BookInventorySlot.objects.filter(book=models.OuterRef("pk"))
+        .values("book")
+        .annotate(total=models.Sum("count"))
+        .values("total")
+    )
+    # One statement; the inventory column is 0 for sharded books
+    Book.objects.update(
+        total_copies=models.F("inventory")
+        + Coalesce(models.Subquery(in_slots), 0)
+        + Coalesce(models.Subquery(on_loan), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_service_api', '0017_borrowing_book_active_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
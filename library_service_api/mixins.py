@@ -0,0 +1,112 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _query_param_set(request, name):
+    value = request.query_params.get(name, "")
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+class DynamicFieldsSerializerMixin:
+    """
+    Sparse fieldsets and embedded expansion for read requests.
+
+    ?fields=id,borrow_date keeps only the listed fields.
+    ?expand=book replaces a field with the nested serializer registered
+    in `expandable_fields` (name -> serializer class).
+    `related_fields` maps a field name to the select_related paths it
+    needs; DynamicQuerysetMixin uses it to shape the queryset.
+    `always_loaded_fields` are model fields the serializer reads even
+    when they are not rendered.
+    `expanded_prefetches` maps an expandable field to a callable that
+    returns the Prefetch loading it when expanded, in place of its
+    select_related paths (for nested serializers that need annotations).
+    """
+
+    expandable_fields = {}
+    related_fields = {}
+    always_loaded_fields = ()
+    expanded_prefetches = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expanded = set()
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        for name in _query_param_set(request, "expand"):
+            if name in self.expandable_fields:
+                self.fields[name] = self.expandable_fields[name](
+                    read_only=True
+                )
+                self.expanded.add(name)
+
+        requested = _query_param_set(request, "fields")
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    def _prefetched(self):
+        return [
+            name for name in self.fields
+            if name in self.expanded and name in self.expanded_prefetches
+        ]
+
+    def get_select_related(self):
+        prefetched = self._prefetched()
+        paths = set()
+        for name in self.fields:
+            if name not in prefetched:
+                paths.update(self.related_fields.get(name, ()))
+        return paths
+
+    def get_prefetches(self):
+        return [
+            self.expanded_prefetches[name]() for name in self._prefetched()
+        ]
+
+    def get_only_fields(self):
+        """
+        Model fields to load, or None to load everything.
+
+        Only trimmed (?fields=) requests defer columns; a relation that is
+        loaded with select_related is kept whole.
+        """
+        request = self.context.get("request")
+        if request is None or not _query_param_set(request, "fields"):
+            return None
+
+        opts = self.Meta.model._meta
+        only = {opts.pk.name, *self.always_loaded_fields}
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            try:
+                opts.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            only.add(field.source)
+        return only | self.get_select_related()
+
+
+class DynamicQuerysetMixin:
+    """
+    Adapt the queryset to the fields the serializer will render:
+    select_related for rendered/expanded relations, prefetch_related for
+    expanded_prefetches, only() for ?fields=.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        related = serializer.get_select_related()
+        if related:
+            queryset = queryset.select_related(*related)
+        prefetches = serializer.get_prefetches()
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        only = serializer.get_only_fields()
+        if only:
+            queryset = queryset.only(*only)
+        return queryset
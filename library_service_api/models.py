@@ -1,5 +1,79 @@
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils.timezone import now
+
+from library_service_api.expressions import DaysBetween
+
+
+class BookQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Bypasses Book.save(), so count the new books' copies here
+        objs = list(objs)
+        for book in objs:
+            book.fill_total_copies()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def with_available_inventory(self):
+        """
+        Annotate available_inventory: the inventory column for regular
+        books and the sum of the counter slots for sharded ones.
+        """
+        slots_total = (
+            BookInventorySlot.objects.filter(book=models.OuterRef("pk"))
+            .values("book")
+            .annotate(total=models.Sum("count"))
+            .values("total")
+        )
+        return self.annotate(
+            available_inventory=models.Case(
+                models.When(inventory_shards=0, then=models.F("inventory")),
+                default=Coalesce(models.Subquery(slots_total), 0),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+    def with_next_available_date(self, today=None):
+        """
+        Annotate next_available_date: for books with no copy left, the
+        earliest expected return among their active borrowings (today
+        if that is already past), else None.
+
+        Needs with_available_inventory(). The subquery is one seek on
+        the (book, expected_return_date) index of active borrowings and
+        only runs for out-of-stock books.
+        """
+        due = (
+            Borrowing.objects.filter(
+                book=models.OuterRef("pk"),
+                actual_return_date__isnull=True
+            )
+            .order_by("expected_return_date")
+            .values("expected_return_date")[:1]
+        )
+        today = models.Value(
+            today or now().date(), output_field=models.DateField()
+        )
+        return self.annotate(
+            next_available_date=models.Case(
+                models.When(
+                    available_inventory=0,
+                    # Not GREATEST(due, today): PostgreSQL's ignores the
+                    # NULL of a book with no loans and would say today
+                    then=models.Case(
+                        models.When(
+                            LessThan(models.Subquery(due), today),
+                            then=today,
+                        ),
+                        default=models.Subquery(due),
+                    ),
+                ),
+                default=None,
+                output_field=models.DateField(),
+            )
+        )
 
 
 class Book(models.Model):
@@ -19,13 +93,101 @@ class Book(models.Model):
         choices=COVER_CHOICES,
         default="SOFT"
     )
+    # 0 keeps the stock in `inventory`, N > 0 spreads it over N
+    # BookInventorySlot rows so concurrent borrows lock different rows
+    inventory_shards = models.PositiveSmallIntegerField(default=0)
+    # Exponentially decayed borrow count, relative to the trending epoch
+    # (see services/trending_service.py)
+    trending_score = models.FloatField(default=0)
+    # Copies the library owns: available + on loan. Only inventory edits
+    # change it; `manage.py check_inventory` verifies the stock against it
+    total_copies = models.PositiveIntegerField(default=0)
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         ordering = ["title"]
+        indexes = [
+            models.Index(fields=["title"]),
+            models.Index(fields=["author"]),
+            models.Index(fields=["-trending_score"]),
+        ]
 
     def __str__(self):
         return f"{self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        book = super().from_db(db, field_names, values)
+        # Lets signal handlers tell which fields a save actually changed
+        book._loaded_values = dict(zip(field_names, values))
+        return book
+
+    def fill_total_copies(self):
+        """A new book starts with all of its copies on the shelf"""
+        if not self.total_copies:
+            self.total_copies = self.inventory
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.fill_total_copies()
+        super().save(*args, **kwargs)
+
+
+class BookInventorySlot(models.Model):
+    book = models.ForeignKey(
+        "Book",
+        on_delete=models.CASCADE,
+        related_name="inventory_slots"
+    )
+    slot = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["book", "slot"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "slot"],
+                name="unique_inventory_slot_per_book"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} slot {self.slot}: {self.count}"
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def with_accrual(self, today=None):
+        """
+        Annotate days_overdue and accrued_fine: what an active borrowing
+        would be fined if it were returned today. Returned borrowings
+        have 0; their fine is a Payment.
+        """
+        today = today or now().date()
+        overdue = models.Q(
+            actual_return_date__isnull=True,
+            expected_return_date__lt=today
+        )
+        return self.annotate(
+            days_overdue=models.Case(
+                models.When(
+                    overdue,
+                    then=DaysBetween(
+                        models.Value(today),
+                        models.F("expected_return_date")
+                    ),
+                ),
+                default=0,
+                output_field=models.IntegerField(),
+            ),
+            accrued_fine=models.ExpressionWrapper(
+                models.F("days_overdue") * models.F("book__daily_fee"),
+                output_field=models.DecimalField(
+                    max_digits=10, decimal_places=2
+                ),
+            ),
+        )
+
 
 class Borrowing(models.Model):
     borrow_date = models.DateField(auto_now_add=True)
@@ -43,8 +205,42 @@ class Borrowing(models.Model):
         related_name="borrowings"
     )
 
+    objects = BorrowingQuerySet.as_manager()
+
     class Meta:
         ordering = ["-borrow_date"]
+        indexes = [
+            models.Index(fields=["borrow_date"]),
+            models.Index(fields=["expected_return_date"]),
+            # Partial, so "is null" lookups go to the index below instead
+            # of this one
+            models.Index(
+                fields=["actual_return_date"],
+                condition=models.Q(actual_return_date__isnull=False),
+                name="borrowing_returned_idx",
+            ),
+            # A user's or a book's borrowings, newest first or by date range
+            models.Index(
+                fields=["user", "-borrow_date"],
+                name="borrowing_user_borrow_idx",
+            ),
+            models.Index(
+                fields=["book", "-borrow_date"],
+                name="borrowing_book_borrow_idx",
+            ),
+            # When an out-of-stock book's next copy is due back
+            models.Index(
+                fields=["book", "expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_book_active_due_idx",
+            ),
+            # Overdue lookups only ever look at active borrowings
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} borrowed {self.book.title}"
@@ -79,10 +275,244 @@ class Payment(models.Model):
     session_id = models.CharField(max_length=255, unique=True)
     money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # Also serves status alone
+            models.Index(
+                fields=["status", "type"],
+                name="payment_status_type_idx",
+            ),
+            models.Index(fields=["type"]),
+        ]
+
+    def __str__(self):
+        return (f"Payment for borrowing ID: "
+                f"{self.borrowing_id} "
+                f"({self.get_status_display()})")
+
+
+class ArchivedBorrowing(models.Model):
+    """Returned and settled borrowing moved out of the hot table"""
+
+    id = models.BigIntegerField(primary_key=True)
+    borrow_date = models.DateField()
+    expected_return_date = models.DateField()
+    actual_return_date = models.DateField()
+    book = models.ForeignKey(
+        "Book",
+        on_delete=models.CASCADE,
+        related_name="archived_borrowings"
+    )
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="archived_borrowings"
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-borrow_date"]
+        indexes = [
+            models.Index(fields=["user", "borrow_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} borrowed {self.book.title}"
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(
+        max_length=8,
+        choices=Payment.StatusChoices.choices
+    )
+    type = models.CharField(
+        max_length=7,
+        choices=Payment.TypeChoices.choices
+    )
+    borrowing = models.ForeignKey(
+        "ArchivedBorrowing",
+        on_delete=models.CASCADE,
+        related_name="payments"
+    )
+    session_url = models.URLField(max_length=500)
+    session_id = models.CharField(max_length=255, unique=True)
+    money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
+
     class Meta:
         ordering = ["-id"]
 
     def __str__(self):
         return (f"Payment for borrowing ID: "
-                f"{self.borrowing.id} "
+                f"{self.borrowing_id} "
                 f"({self.get_status_display()})")
+
+
+class DailyBookCirculation(models.Model):
+    """Borrows and returns per book per day, kept up to date incrementally"""
+
+    day = models.DateField()
+    book = models.ForeignKey(
+        "Book",
+        on_delete=models.CASCADE,
+        related_name="daily_circulation"
+    )
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "book"],
+                name="unique_circulation_per_day_and_book"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.book_id}: +{self.borrowed}/-{self.returned}"
+
+
+class DailyPaymentTotal(models.Model):
+    """Payment count and amount per day, type and status"""
+
+    day = models.DateField()
+    type = models.CharField(
+        max_length=7,
+        choices=Payment.TypeChoices.choices
+    )
+    status = models.CharField(
+        max_length=8,
+        choices=Payment.StatusChoices.choices
+    )
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "type", "status"],
+                name="unique_payment_total_per_day_type_status"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.type} {self.status}: {self.amount}"
+
+
+class BookNeighbor(models.Model):
+    """Precomputed "readers also borrowed" list, rank 0 is the closest"""
+
+    book = models.ForeignKey(
+        "Book",
+        on_delete=models.CASCADE,
+        related_name="neighbors"
+    )
+    neighbor = models.ForeignKey(
+        "Book",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["book", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "rank"],
+                name="unique_neighbor_rank_per_book"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys"
+    )
+    request_fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"],
+                name="unique_idempotency_key_per_user"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key}"
+
+    @property
+    def is_completed(self):
+        return self.status_code is not None
+
+
+# Written by `manage.py boot`, reported by the health endpoint
+BOOT_DURATION_CHECKPOINT = "boot:duration"
+
+
+class JobCheckpoint(models.Model):
+    """Small key/value store for state kept between maintenance runs"""
+
+    name = models.CharField(max_length=100, unique=True)
+    value = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def get_value(cls, name, default=None):
+        value = cls.objects.filter(name=name).values_list(
+            "value", flat=True
+        ).first()
+        return default if value is None else value
+
+    @classmethod
+    def set_value(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={"value": value})
+
+
+class SlowQuery(models.Model):
+    """Statements over SLOW_QUERY_THRESHOLD_MS, one row per fingerprint"""
+
+    fingerprint = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    view = models.CharField(max_length=255, blank=True)
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    plan = models.TextField(blank=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-total_ms"]
+        indexes = [
+            models.Index(fields=["-total_ms"]),
+        ]
+
+    def __str__(self):
+        return f"{self.calls} x {self.sql[:60]}"
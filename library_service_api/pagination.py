@@ -0,0 +1,213 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import (LimitOffsetPagination,
+                                       PageNumberPagination)
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Row count estimate from the PostgreSQL planner, None elsewhere.
+
+    Unfiltered querysets read pg_class.reltuples, filtered ones the row
+    estimate of the top node of their EXPLAIN plan. Neither scans the table.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 for tables that were never analyzed
+            if row and row[0] >= 0:
+                return int(row[0])
+            return None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _count_cache_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    raw = f"{queryset.db}:{sql}:{params!r}"
+    return "count:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def paginated_count(queryset):
+    """
+    Return (count, is_estimate) for a paginated queryset.
+
+    Result sets estimated below EXACT_COUNT_THRESHOLD are counted exactly.
+    Larger ones use the planner estimate on PostgreSQL; on other databases
+    the exact count is cached for COUNT_CACHE_TTL seconds and replayed
+    as an estimate.
+    """
+    estimate = estimate_count(queryset)
+    if estimate is not None:
+        if estimate < settings.EXACT_COUNT_THRESHOLD:
+            return queryset.count(), False
+        return estimate, True
+
+    key = _count_cache_key(queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    count = queryset.count()
+    if count >= settings.EXACT_COUNT_THRESHOLD:
+        cache.set(key, count, settings.COUNT_CACHE_TTL)
+    return count, False
+
+
+class EstimatedCountPage(Page):
+    """Page whose next page is known from an extra row, not the count"""
+
+    more = None
+
+    def has_next(self):
+        if self.more is None:
+            return super().has_next()
+        return self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Django paginator counting rows with paginated_count().
+
+    An estimate can be too low (stale statistics, rows added since the
+    count was cached), so with one page numbers are not checked against
+    it: a page reads one row past its end to tell whether another
+    follows, and only an empty page past the first is invalid.
+    """
+
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimate = paginated_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        self.count  # counting sets count_is_estimate
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.more = len(rows) > self.per_page
+        if page.more and number >= self.num_pages:
+            # Let page links (admin, DRF's "last") reach the next page
+            self.num_pages = number + 1
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+
+def _with_estimate_flag(schema):
+    schema["properties"]["count_is_estimate"] = {
+        "type": "boolean",
+        "example": False,
+    }
+    return schema
+
+
+class EstimatedCountPageNumberPagination(PageNumberPagination):
+    """Page number pagination flagging approximate counts"""
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_is_estimate"] = (
+            self.page.paginator.count_is_estimate
+        )
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return _with_estimate_flag(
+            super().get_paginated_response_schema(schema)
+        )
+
+
+class EstimatedCountLimitOffsetPagination(LimitOffsetPagination):
+    """Limit/offset pagination flagging approximate counts"""
+
+    count_is_estimate = False
+    more = False
+
+    def get_count(self, queryset):
+        count, self.count_is_estimate = paginated_count(queryset)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = self.get_count(queryset)
+        self.offset = self.get_offset(request)
+        self.request = request
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if not self.count_is_estimate:
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return list(queryset[self.offset:self.offset + self.limit])
+
+        # Like EstimatedCountPaginator: read one row past the page
+        # instead of trusting the estimate for where the rows end
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.more = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.count_is_estimate:
+            return super().get_next_link()
+        if not self.more:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_is_estimate"] = self.count_is_estimate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return _with_estimate_flag(
+            super().get_paginated_response_schema(schema)
+        )
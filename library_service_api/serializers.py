@@ -1,18 +1,89 @@
 from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.timezone import now
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
-from library_service_api.models import Book, Borrowing, Payment
+from library_service_api.mixins import DynamicFieldsSerializerMixin
+from library_service_api.models import (ArchivedBorrowing,
+                                        ArchivedPayment,
+                                        Book,
+                                        Borrowing,
+                                        Payment)
+from library_service_api.services.inventory_service import (
+    available_inventory,
+    next_available_date,
+    set_inventory,
+    take_copy
+)
 from library_service_api.services.payments_service import create_stripe_session
+from library_service_api.services.reporting_service import record_borrow
 from library_service_api.services.telegram_service import send_telegram_message
+from library_service_api.services.trending_service import count_borrow
+from library_service_users.serializers import CustomerSerializer
 
+MONEY = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class BookSerializer(DynamicFieldsSerializerMixin, ModelSerializer):
+    always_loaded_fields = ("inventory_shards",)
+    next_available_date = serializers.DateField(
+        read_only=True, allow_null=True
+    )
 
-class BookSerializer(ModelSerializer):
     class Meta:
         model = Book
-        fields = "__all__"
+        exclude = ["trending_score"]
+        read_only_fields = ["inventory_shards", "total_copies"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.inventory_shards and "inventory" in data:
+            data["inventory"] = getattr(
+                instance,
+                "available_inventory",
+                None
+            )
+            if data["inventory"] is None:
+                data["inventory"] = available_inventory(instance)
+        if (
+                "next_available_date" in data
+                and not hasattr(instance, "next_available_date")
+        ):
+            data["next_available_date"] = self.fields[
+                "next_available_date"
+            ].to_representation(next_available_date(instance))
+        return data
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            # Also moves total_copies by the copies added or removed
+            if "inventory" in validated_data:
+                set_inventory(instance, validated_data.pop("inventory"))
+            for name, value in validated_data.items():
+                setattr(instance, name, value)
+            # Only the edited columns: stock, total_copies and
+            # trending_score are counters moved by concurrent borrows
+            instance.save(update_fields=list(validated_data))
+        return instance
 
 
-class BorrowingSerializer(serializers.ModelSerializer):
+class BorrowingSerializer(
+    DynamicFieldsSerializerMixin,
+    serializers.ModelSerializer
+):
+    expandable_fields = {"book": BookSerializer, "user": CustomerSerializer}
+    related_fields = {"book": ["book"], "user": ["user"]}
+    # Expanded books render stock and next_available_date, which would
+    # otherwise be a query per sharded or out-of-stock book
+    expanded_prefetches = {
+        "book": lambda: Prefetch(
+            "book",
+            queryset=Book.objects.with_available_inventory()
+            .with_next_available_date()
+        )
+    }
+
     user = serializers.StringRelatedField(read_only=True)
     book = serializers.StringRelatedField(read_only=True)
     book_id = serializers.PrimaryKeyRelatedField(
@@ -20,6 +91,8 @@ class BorrowingSerializer(serializers.ModelSerializer):
         source="book",
         write_only=True
     )
+    days_overdue = serializers.SerializerMethodField()
+    accrued_fine = serializers.SerializerMethodField()
 
     class Meta:
         model = Borrowing
@@ -31,23 +104,38 @@ class BorrowingSerializer(serializers.ModelSerializer):
             "book",
             "book_id",
             "user",
+            "days_overdue",
+            "accrued_fine",
         ]
         read_only_fields = ["id", "borrow_date", "user", "actual_return_date"]
 
+    def get_days_overdue(self, borrowing) -> int:
+        days = getattr(borrowing, "days_overdue", None)
+        if days is not None:
+            return days
+        # Not loaded with with_accrual(), e.g. right after create/return
+        if borrowing.actual_return_date:
+            return 0
+        return max((now().date() - borrowing.expected_return_date).days, 0)
+
+    @extend_schema_field(MONEY)
+    def get_accrued_fine(self, borrowing):
+        fine = getattr(borrowing, "accrued_fine", None)
+        if fine is None:
+            days = self.get_days_overdue(borrowing)
+            fine = days * borrowing.book.daily_fee if days else 0
+        return MONEY.to_representation(fine)
+
     def create(self, validated_data):
         with transaction.atomic():
             book = validated_data.get("book")
             if not book:
                 raise serializers.ValidationError("Book is required.")
 
-            book = Book.objects.select_for_update().get(id=book.id)
-            if book.inventory < 1:
+            if not take_copy(book):
                 raise serializers.ValidationError(
                     "This book is not available for borrowing.")
 
-            book.inventory -= 1
-            book.save(update_fields=["inventory"])
-
             validated_data["user"] = self.context["request"].user
             borrowing = super().create(validated_data)
 
@@ -60,6 +148,9 @@ class BorrowingSerializer(serializers.ModelSerializer):
                 self.context["request"],
                 borrowing, total_amount
             )
+            # Shared counter rows, updated after the commit
+            record_borrow(borrowing)
+            count_borrow(borrowing)
 
             send_telegram_message(
                 f"📚 New borrowing created!\n\n"
@@ -71,7 +162,13 @@ class BorrowingSerializer(serializers.ModelSerializer):
             return borrowing
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(
+    DynamicFieldsSerializerMixin,
+    serializers.ModelSerializer
+):
+    expandable_fields = {"borrowing": BorrowingSerializer}
+    related_fields = {"borrowing": ["borrowing__book", "borrowing__user"]}
+
     borrowing = serializers.StringRelatedField(read_only=True)
 
     class Meta:
@@ -86,3 +183,41 @@ class PaymentSerializer(serializers.ModelSerializer):
             "money_to_pay",
         ]
         read_only_fields = fields
+
+
+class ArchivedBorrowingSerializer(BorrowingSerializer):
+    class Meta(BorrowingSerializer.Meta):
+        model = ArchivedBorrowing
+        read_only_fields = BorrowingSerializer.Meta.fields
+
+
+class ArchivedPaymentSerializer(PaymentSerializer):
+    expandable_fields = {"borrowing": ArchivedBorrowingSerializer}
+
+    class Meta(PaymentSerializer.Meta):
+        model = ArchivedPayment
+
+
+class MostBorrowedSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    title = serializers.CharField()
+    borrowed = serializers.IntegerField()
+
+
+class ReportSummarySerializer(serializers.Serializer):
+    """Shape of /reports/summary/, amounts are rendered as numbers"""
+
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    revenue = serializers.DecimalField(
+        max_digits=14, decimal_places=2, coerce_to_string=False
+    )
+    fines_collected = serializers.DecimalField(
+        max_digits=14, decimal_places=2, coerce_to_string=False
+    )
+    outstanding = serializers.DecimalField(
+        max_digits=14, decimal_places=2, coerce_to_string=False
+    )
+    borrowed = serializers.IntegerField()
+    returned = serializers.IntegerField()
+    most_borrowed = MostBorrowedSerializer(many=True)
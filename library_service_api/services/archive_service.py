@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import now
+
+from library_service_api.models import (ArchivedBorrowing,
+                                        ArchivedPayment,
+                                        Borrowing,
+                                        Payment)
+
+BORROWING_FIELDS = [
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "book_id",
+    "user_id",
+]
+PAYMENT_FIELDS = [
+    "id",
+    "status",
+    "type",
+    "borrowing_id",
+    "session_url",
+    "session_id",
+    "money_to_pay",
+]
+
+
+def archive_horizon(days):
+    return now().date() - timedelta(days=days)
+
+
+def archivable_borrowings(horizon):
+    """Borrowings returned before `horizon` with every payment paid"""
+    unsettled = Payment.objects.filter(
+        borrowing=OuterRef("pk")
+    ).exclude(status=Payment.StatusChoices.PAID)
+    return Borrowing.objects.filter(
+        actual_return_date__lt=horizon
+    ).exclude(Exists(unsettled))
+
+
+def archive_batch(horizon, batch_size):
+    """
+    Move one batch of borrowings and their payments to the archive.
+
+    Each batch is its own transaction, so an interrupted run loses
+    nothing and the next run simply continues with what is left.
+    Returns the number of borrowings moved.
+    """
+    with transaction.atomic():
+        ids = list(
+            archivable_borrowings(horizon)
+            .select_for_update()
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        ArchivedBorrowing.objects.bulk_create(
+            ArchivedBorrowing(**row)
+            for row in Borrowing.objects.filter(id__in=ids)
+            .order_by()
+            .values(*BORROWING_FIELDS)
+        )
+        payments = Payment.objects.filter(borrowing_id__in=ids)
+        ArchivedPayment.objects.bulk_create(
+            ArchivedPayment(**row)
+            for row in payments.order_by().values(*PAYMENT_FIELDS)
+        )
+        payments.delete()
+        Borrowing.objects.filter(id__in=ids).delete()
+        return len(ids)
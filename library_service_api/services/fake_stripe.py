@@ -0,0 +1,200 @@
+"""
+Local stand-in for the Stripe Checkout Session API.
+
+Serves create, retrieve and list of checkout sessions over HTTP, so the
+stripe library can be pointed at it with STRIPE_API_BASE and the borrow,
+return and payment success flows can be load-tested offline. Latency,
+error rate and the share of sessions that end up paid are configurable.
+
+    python manage.py run_fake_stripe --port 12111 --latency 0.2
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SESSIONS_PATH = "/v1/checkout/sessions"
+UNIT_AMOUNT = re.compile(r"line_items\[(\d+)]\[price_data]\[unit_amount]")
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    server_version = "FakeStripe/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _respond(self, status_code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status_code, error_type, message, **extra):
+        self._respond(
+            status_code,
+            {"error": {"type": error_type, "message": message, **extra}}
+        )
+
+    def _simulate(self):
+        """Apply the configured latency, returns False on an injected error"""
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < self.server.error_rate:
+            self._error(500, "api_error", "Injected fake Stripe failure.")
+            return False
+        return True
+
+    def do_POST(self):
+        if urlsplit(self.path).path != SESSIONS_PATH:
+            self._error(404, "invalid_request_error", "Unrecognized URL.")
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        params = parse_qs(self.rfile.read(length).decode())
+        if not self._simulate():
+            return
+        session = self.server.create_session(
+            params, self.headers.get("Idempotency-Key")
+        )
+        self._respond(200, session)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not self._simulate():
+            return
+        if url.path == SESSIONS_PATH:
+            query = parse_qs(url.query)
+            self._respond(200, self.server.list_sessions(
+                limit=int(query.get("limit", ["10"])[0]),
+                starting_after=query.get("starting_after", [None])[0],
+            ))
+            return
+        if url.path.startswith(f"{SESSIONS_PATH}/"):
+            session_id = url.path.rsplit("/", 1)[1]
+            session = self.server.get_session(session_id)
+            if session is None:
+                self._error(
+                    404,
+                    "invalid_request_error",
+                    f"No such checkout.session: '{session_id}'",
+                    code="resource_missing",
+                    param="session",
+                )
+                return
+            self._respond(200, session)
+            return
+        self._error(404, "invalid_request_error", "Unrecognized URL.")
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """
+    Checkout sessions kept in memory.
+
+    `latency` is the mean delay in seconds added to every request,
+    `error_rate` the share of requests answered with a 500 and
+    `paid_rate` the share of sessions the customer completes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0,
+                 error_rate=0.0, paid_rate=1.0, verbose=False):
+        super().__init__((host, port), FakeStripeHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.paid_rate = paid_rate
+        self.verbose = verbose
+        self.sessions = {}
+        self.idempotency_keys = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def create_session(self, params, idempotency_key=None):
+        with self.lock:
+            if idempotency_key in self.idempotency_keys:
+                return self.sessions[self.idempotency_keys[idempotency_key]]
+
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            amount_total = 0
+            for key, values in params.items():
+                match = UNIT_AMOUNT.fullmatch(key)
+                if match:
+                    quantity = params.get(
+                        f"line_items[{match.group(1)}][quantity]", ["1"]
+                    )[0]
+                    amount_total += int(values[0]) * int(quantity)
+            paid = random.random() < self.paid_rate
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "amount_total": amount_total,
+                "cancel_url": params.get("cancel_url", [None])[0],
+                "created": int(time.time()),
+                "currency": "usd",
+                "livemode": False,
+                "mode": params.get("mode", ["payment"])[0],
+                "payment_status": "paid" if paid else "unpaid",
+                "status": "complete" if paid else "open",
+                "success_url": params.get("success_url", [None])[0],
+                "url": f"{self.url}/pay/{session_id}",
+            }
+            self.sessions[session_id] = session
+            if idempotency_key:
+                self.idempotency_keys[idempotency_key] = session_id
+            return session
+
+    def get_session(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def list_sessions(self, limit=10, starting_after=None):
+        with self.lock:
+            # Newest first, like Stripe
+            sessions = list(reversed(self.sessions.values()))
+        ids = [session["id"] for session in sessions]
+        if starting_after in ids:
+            sessions = sessions[ids.index(starting_after) + 1:]
+        return {
+            "object": "list",
+            "data": sessions[:limit],
+            "has_more": len(sessions) > limit,
+            "url": SESSIONS_PATH,
+        }
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a slow response are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset(self):
+        with self.lock:
+            self.sessions.clear()
+            self.idempotency_keys.clear()
+
+    def start(self):
+        """Serve from a background thread, returns the base URL"""
+        self.thread = threading.Thread(
+            target=self.serve_forever,
+            name="fake-stripe",
+            daemon=True
+        )
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
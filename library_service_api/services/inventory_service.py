@@ -0,0 +1,213 @@
+import random
+
+from django.db import transaction
+from django.db.models import (Count,
+                              ExpressionWrapper,
+                              F,
+                              FilteredRelation,
+                              IntegerField,
+                              Q,
+                              Sum)
+from django.utils.timezone import now
+
+from library_service_api.models import Book, BookInventorySlot, Borrowing
+
+
+def _shard_sizes(total, shards):
+    """Split total copies as evenly as possible over the shards"""
+    base, extra = divmod(total, shards)
+    return [base + (1 if slot < extra else 0) for slot in range(shards)]
+
+
+def available_inventory(book):
+    """Number of copies that can be borrowed right now"""
+    if not book.inventory_shards:
+        return book.inventory
+    total = BookInventorySlot.objects.filter(book=book).aggregate(
+        total=Sum("count")
+    )["total"]
+    return total or 0
+
+
+def next_available_date(book):
+    """
+    When a copy of an out-of-stock book is due back, for books loaded
+    without BookQuerySet.with_next_available_date()
+    """
+    if available_inventory(book):
+        return None
+    due = Borrowing.objects.filter(
+        book=book,
+        actual_return_date__isnull=True
+    ).order_by("expected_return_date").values_list(
+        "expected_return_date", flat=True
+    ).first()
+    return max(due, now().date()) if due else None
+
+
+def take_copy(book):
+    """
+    Decrement the stock of a book, returns False if none is left.
+
+    Must run inside a transaction. A single conditional UPDATE both
+    checks and takes the copy, so there is no separate locked read. For
+    a sharded book only one randomly chosen slot row is locked, so
+    borrows of the same title proceed in parallel instead of queueing
+    on the Book row.
+    """
+    if not book.inventory_shards:
+        taken = Book.objects.filter(id=book.id, inventory__gt=0).update(
+            inventory=F("inventory") - 1
+        )
+        if taken:
+            book.inventory -= 1
+        return bool(taken)
+
+    shards = book.inventory_shards
+    start = random.randrange(shards)
+    for offset in range(shards):
+        updated = BookInventorySlot.objects.filter(
+            book=book,
+            slot=(start + offset) % shards,
+            count__gt=0,
+        ).update(count=F("count") - 1)
+        if updated:
+            return True
+    return False
+
+
+def put_copy(book, copies=1):
+    """Increment the stock of a book, inside a transaction"""
+    if not book.inventory_shards:
+        Book.objects.filter(id=book.id).update(
+            inventory=F("inventory") + copies
+        )
+        return
+
+    BookInventorySlot.objects.filter(
+        book=book,
+        slot=random.randrange(book.inventory_shards),
+    ).update(count=F("count") + copies)
+
+
+def _write_inventory(book, available):
+    """Overwrite the available stock, inside a transaction"""
+    if not book.inventory_shards:
+        Book.objects.filter(id=book.id).update(inventory=available)
+        book.inventory = available
+        return
+
+    slots = list(
+        BookInventorySlot.objects.select_for_update()
+        .filter(book=book)
+        .order_by("slot")
+    )
+    for slot, count in zip(
+            slots, _shard_sizes(available, book.inventory_shards)
+    ):
+        slot.count = count
+    BookInventorySlot.objects.bulk_update(slots, ["count"])
+
+
+def set_inventory(book, total):
+    """
+    Overwrite the stock of a book (admin edits).
+
+    Copies added to or removed from the shelf are added to or removed
+    from total_copies as well.
+    """
+    with transaction.atomic():
+        locked = Book.objects.select_for_update().get(id=book.id)
+        delta = total - available_inventory(locked)
+        _write_inventory(locked, total)
+        Book.objects.filter(id=book.id).update(
+            total_copies=F("total_copies") + delta
+        )
+        book.inventory = locked.inventory
+        book.total_copies = locked.total_copies + delta
+
+
+def find_drift():
+    """
+    Books whose available stock is not total_copies minus the copies on
+    loan, as one grouped query.
+
+    Rows carry available_inventory, on_loan and expected (what the
+    stock should be; negative when total_copies itself is too low).
+    """
+    return (
+        Book.objects.with_available_inventory()
+        .only("title", "inventory", "inventory_shards", "total_copies")
+        .annotate(
+            active=FilteredRelation(
+                "borrowings",
+                condition=Q(borrowings__actual_return_date__isnull=True)
+            ),
+            on_loan=Count("active"),
+            expected=ExpressionWrapper(
+                F("total_copies") - F("on_loan"),
+                output_field=IntegerField()
+            ),
+        )
+        .exclude(available_inventory=F("expected"))
+        .order_by("id")
+    )
+
+
+def repair_drift(book_ids, batch_size=1000):
+    """
+    Set the stock of the given books back to total_copies minus the
+    copies on loan, one transaction per batch.
+
+    Each batch is locked and checked again, so books that were fixed or
+    changed in the meantime are left alone. Books whose total is below
+    the copies on loan cannot be repaired from the stock; their ids are
+    returned with the number of books repaired.
+    """
+    repaired, unrepairable = 0, []
+    for start in range(0, len(book_ids), batch_size):
+        batch = book_ids[start:start + batch_size]
+        with transaction.atomic():
+            list(
+                Book.objects.select_for_update()
+                .filter(id__in=batch)
+                .values_list("id", flat=True)
+            )
+            fixed = []
+            for book in find_drift().filter(id__in=batch):
+                if book.expected < 0:
+                    unrepairable.append(book.id)
+                elif book.inventory_shards:
+                    _write_inventory(book, book.expected)
+                    repaired += 1
+                else:
+                    book.inventory = book.expected
+                    fixed.append(book)
+            Book.objects.bulk_update(fixed, ["inventory"])
+            repaired += len(fixed)
+    return repaired, unrepairable
+
+
+def set_shards(book, shards):
+    """
+    Switch a book between a single counter and N counter slots.
+
+    The stock is moved as is, so available inventory does not change.
+    With shards=0 the slots are folded back into Book.inventory.
+    """
+    with transaction.atomic():
+        book = Book.objects.select_for_update().get(id=book.id)
+        total = available_inventory(book)
+        BookInventorySlot.objects.filter(book=book).delete()
+
+        if shards:
+            BookInventorySlot.objects.bulk_create(
+                BookInventorySlot(book=book, slot=slot, count=count)
+                for slot, count in enumerate(_shard_sizes(total, shards))
+            )
+            book.inventory = 0
+        else:
+            book.inventory = total
+        book.inventory_shards = shards
+        book.save(update_fields=["inventory", "inventory_shards"])
+        return book
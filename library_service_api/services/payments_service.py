@@ -1,11 +1,13 @@
-import stripe
 from django.urls import reverse
 from library_service_api.models import Payment
+from library_service_api.services.reporting_service import (
+    record_payment,
+    record_payments
+)
+from library_service_api.services.stripe_client import create_checkout_session
 
 
-def create_stripe_session(request, borrowing, amount, payment_type="PAYMENT"):
-    """Create Stripe Session і Payment"""
-
+def _checkout_session(request, borrowing, amount):
     success_path = reverse("library_service_api:payments-success")
     success_url = (request.build_absolute_uri(success_path)
                    + "?session_id={CHECKOUT_SESSION_ID}")
@@ -13,7 +15,7 @@ def create_stripe_session(request, borrowing, amount, payment_type="PAYMENT"):
     cancel_path = reverse("library_service_api:payments-cancel")
     cancel_url = request.build_absolute_uri(cancel_path)
 
-    session = stripe.checkout.Session.create(
+    return create_checkout_session(
         payment_method_types=["card"],
         mode="payment",
         line_items=[
@@ -32,7 +34,9 @@ def create_stripe_session(request, borrowing, amount, payment_type="PAYMENT"):
         cancel_url=cancel_url,
     )
 
-    payment = Payment.objects.create(
+
+def _pending_payment(borrowing, amount, payment_type, session):
+    return Payment(
         borrowing=borrowing,
         type=payment_type,
         status=Payment.StatusChoices.PENDING,
@@ -41,9 +45,25 @@ def create_stripe_session(request, borrowing, amount, payment_type="PAYMENT"):
         session_url=session.url,
     )
 
+
+def create_stripe_session(request, borrowing, amount, payment_type="PAYMENT"):
+    """Create Stripe Session і Payment"""
+    session = _checkout_session(request, borrowing, amount)
+    payment = _pending_payment(borrowing, amount, payment_type, session)
+    payment.save()
+    record_payment(payment, borrowing)
+
     return payment
 
 
+def calculate_fine(borrowing):
+    """Daily fee for every day past the expected return date"""
+    days_late = (
+            borrowing.actual_return_date - borrowing.expected_return_date
+    ).days
+    return max(days_late, 0) * borrowing.book.daily_fee
+
+
 def create_fine_payment(request, borrowing, fine_amount):
     """Create Stripe Session & Payment for fines"""
     return create_stripe_session(
@@ -52,3 +72,32 @@ def create_fine_payment(request, borrowing, fine_amount):
         amount=fine_amount,
         payment_type=Payment.TypeChoices.FINE,
     )
+
+
+def open_fine_payments(request, fines):
+    """
+    Create Stripe Sessions for many fines, returning unsaved Payments.
+
+    `fines` is a list of (borrowing, amount). The sessions are created
+    one by one (Stripe has no batch call), so callers make these calls
+    before locking anything and save the payments with save_payments().
+    """
+    return [
+        _pending_payment(
+            borrowing,
+            amount,
+            Payment.TypeChoices.FINE,
+            _checkout_session(request, borrowing, amount)
+        )
+        for borrowing, amount in fines
+    ]
+
+
+def save_payments(payments):
+    """Insert payments in one INSERT and count them in the rollups"""
+    Payment.objects.bulk_create(payments)
+    record_payments(
+        payments,
+        {payment.borrowing_id: payment.borrowing for payment in payments}
+    )
+    return payments
@@ -0,0 +1,128 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from scipy import sparse
+
+from library_service_api.models import (ArchivedBorrowing,
+                                        BookNeighbor,
+                                        Borrowing,
+                                        JobCheckpoint)
+
+WATERMARK_CHECKPOINT = "recommendations:last_borrowing_id"
+
+
+def _user_book_pairs(model, chunk_size=50000):
+    """(user_id, book_id) columns as int64 arrays, streamed from the DB"""
+    rows = (
+        model.objects.order_by()
+        .values_list("user_id", "book_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    flat = np.fromiter(
+        (value for row in rows for value in row),
+        dtype=np.int64
+    )
+    pairs = flat.reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def load_borrow_matrix():
+    """
+    Binary users x books matrix of everything ever borrowed.
+
+    Returns (matrix, book_ids) where book_ids maps column -> Book.id.
+    """
+    users, books = zip(
+        *(_user_book_pairs(model) for model in (Borrowing, ArchivedBorrowing))
+    )
+    users, books = np.concatenate(users), np.concatenate(books)
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    book_ids, book_index = np.unique(books, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.float32), (user_index, book_index)),
+        shape=(len(user_ids), len(book_ids)),
+    )
+    # Duplicates were summed; borrowing a title twice is still one reader
+    matrix.data[:] = 1
+    return matrix, book_ids
+
+
+def neighbors_for(matrix, columns, top_k):
+    """
+    Top-k cosine neighbours for the given book columns.
+
+    Co-occurrence counts C = XᵀX are normalised by the readers of both
+    books, so bestsellers do not dominate every list. Yields
+    (column, [(neighbour column, score), ...]).
+    """
+    readers = np.asarray(matrix.sum(axis=0)).ravel()
+    norms = np.sqrt(np.maximum(readers, 1))
+    co_occurrence = (matrix[:, columns].T @ matrix).tocsr()
+    scaled = sparse.diags(1 / norms[columns]) @ co_occurrence
+    scaled = (scaled @ sparse.diags(1 / norms)).tocsr()
+
+    for row, column in enumerate(columns):
+        start, end = scaled.indptr[row], scaled.indptr[row + 1]
+        indices = scaled.indices[start:end]
+        scores = scaled.data[start:end]
+        keep = indices != column
+        indices, scores = indices[keep], scores[keep]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            indices, scores = indices[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        yield column, list(zip(indices[order], scores[order]))
+
+
+def build_neighbors(top_k=10, incremental=False, batch_size=5000):
+    """
+    Recompute BookNeighbor rows.
+
+    A full build covers every borrowed book. An incremental one only
+    covers books read by users who borrowed something since the last
+    build, because only their co-occurrence rows can have changed.
+    Returns the number of books refreshed.
+    """
+    watermark = Borrowing.objects.aggregate(last=Max("id"))["last"] or 0
+    matrix, book_ids = load_borrow_matrix()
+    if not len(book_ids):
+        return 0
+
+    columns = np.arange(len(book_ids))
+    if incremental:
+        since = int(JobCheckpoint.get_value(WATERMARK_CHECKPOINT, 0))
+        changed_users = Borrowing.objects.filter(
+            id__gt=since, id__lte=watermark
+        ).values("user_id")
+        changed_books = set()
+        for model in (Borrowing, ArchivedBorrowing):
+            changed_books.update(
+                model.objects.filter(user_id__in=changed_users)
+                .order_by()
+                .values_list("book_id", flat=True)
+                .distinct()
+            )
+        columns = columns[np.isin(book_ids, list(changed_books))]
+
+    refreshed = 0
+    for start in range(0, len(columns), batch_size):
+        batch = columns[start:start + batch_size]
+        rows = [
+            BookNeighbor(
+                book_id=int(book_ids[column]),
+                neighbor_id=int(book_ids[neighbor]),
+                rank=rank,
+                score=float(score),
+            )
+            for column, neighbors in neighbors_for(matrix, batch, top_k)
+            for rank, (neighbor, score) in enumerate(neighbors)
+        ]
+        with transaction.atomic():
+            BookNeighbor.objects.filter(
+                book_id__in=[int(book_ids[column]) for column in batch]
+            ).delete()
+            BookNeighbor.objects.bulk_create(rows, batch_size=1000)
+        refreshed += len(batch)
+
+    JobCheckpoint.set_value(WATERMARK_CHECKPOINT, str(watermark))
+    return refreshed
@@ -0,0 +1,191 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Sum, When
+
+from library_service_api.models import (ArchivedBorrowing,
+                                        ArchivedPayment,
+                                        Borrowing,
+                                        DailyBookCirculation,
+                                        DailyPaymentTotal,
+                                        Payment)
+
+
+def _increment(model, keys, **deltas):
+    """Add deltas to the rollup row identified by keys, creating it"""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another worker created the row first
+        model.objects.filter(**keys).update(**updates)
+
+
+def _after_commit(func, *args, **kwargs):
+    """
+    Apply a rollup update once the business transaction commits.
+
+    Today's rollup rows are touched by every borrow (the global payment
+    total by all of them), so updating them inside the borrow
+    transaction would serialize all borrows on them until the commit.
+    Outside it, each update is a single short statement. A rolled back
+    request records nothing; a crash in between undercounts, which
+    `rebuild_rollups` repairs.
+    """
+    transaction.on_commit(lambda: func(*args, **kwargs))
+
+
+def payment_day(payment, borrowing):
+    """Payments count on the day they were created"""
+    if payment.type == Payment.TypeChoices.FINE:
+        return borrowing.actual_return_date
+    return borrowing.borrow_date
+
+
+def record_borrow(borrowing):
+    _after_commit(
+        _increment,
+        DailyBookCirculation,
+        {"day": borrowing.borrow_date, "book_id": borrowing.book_id},
+        borrowed=1,
+    )
+
+
+def record_returns(borrowings):
+    returned = Counter(
+        (borrowing.actual_return_date, borrowing.book_id)
+        for borrowing in borrowings
+    )
+    # Fixed order, so concurrent batches cannot deadlock
+    for (day, book_id), count in sorted(returned.items()):
+        _after_commit(
+            _increment,
+            DailyBookCirculation,
+            {"day": day, "book_id": book_id},
+            returned=count,
+        )
+
+
+def record_payment(payment, borrowing):
+    record_payments([payment], {borrowing.id: borrowing})
+
+
+def record_payments(payments, borrowings):
+    """Many new payments, one update per day/type/status they fall in"""
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for payment in payments:
+        key = (
+            payment_day(payment, borrowings[payment.borrowing_id]),
+            payment.type,
+            payment.status,
+        )
+        totals[key][0] += 1
+        totals[key][1] += payment.money_to_pay
+    # Fixed order, so concurrent batches cannot deadlock
+    for (day, payment_type, status), (count, amount) in sorted(
+            totals.items()
+    ):
+        _after_commit(
+            _increment,
+            DailyPaymentTotal,
+            {"day": day, "type": payment_type, "status": status},
+            count=count,
+            amount=amount,
+        )
+
+
+def record_payment_status_change(payment, borrowing, old_status):
+    day = payment_day(payment, borrowing)
+    _after_commit(
+        _increment,
+        DailyPaymentTotal,
+        {"day": day, "type": payment.type, "status": old_status},
+        count=-1,
+        amount=-payment.money_to_pay,
+    )
+    record_payment(payment, borrowing)
+
+
+def _circulation_rows(model):
+    borrowed = (
+        model.objects.order_by()
+        .values("borrow_date", "book_id")
+        .annotate(total=Count("id"))
+    )
+    returned = (
+        model.objects.order_by()
+        .filter(actual_return_date__isnull=False)
+        .values("actual_return_date", "book_id")
+        .annotate(total=Count("id"))
+    )
+    for row in borrowed:
+        yield (row["borrow_date"], row["book_id"]), "borrowed", row["total"]
+    for row in returned:
+        yield (
+            (row["actual_return_date"], row["book_id"]),
+            "returned",
+            row["total"]
+        )
+
+
+def _payment_rows(model):
+    rows = (
+        model.objects.order_by()
+        .annotate(
+            day=Case(
+                When(
+                    type=Payment.TypeChoices.FINE,
+                    then=F("borrowing__actual_return_date")
+                ),
+                default=F("borrowing__borrow_date"),
+            )
+        )
+        .values("day", "type", "status")
+        .annotate(count=Count("id"), amount=Sum("money_to_pay"))
+    )
+    for row in rows:
+        yield (row["day"], row["type"], row["status"]), row
+
+
+def rebuild_rollups():
+    """
+    Recompute every rollup from the live and archived tables.
+
+    One grouped query per table; run it when the incremental counters
+    are suspected to be off, or after changing the rollup definitions.
+    """
+    circulation = defaultdict(lambda: {"borrowed": 0, "returned": 0})
+    for model in (Borrowing, ArchivedBorrowing):
+        for key, field, total in _circulation_rows(model):
+            circulation[key][field] += total
+
+    payments = defaultdict(lambda: {"count": 0, "amount": Decimal("0")})
+    for model in (Payment, ArchivedPayment):
+        for key, row in _payment_rows(model):
+            payments[key]["count"] += row["count"]
+            payments[key]["amount"] += row["amount"] or 0
+
+    with transaction.atomic():
+        DailyBookCirculation.objects.all().delete()
+        DailyPaymentTotal.objects.all().delete()
+        DailyBookCirculation.objects.bulk_create(
+            (
+                DailyBookCirculation(day=day, book_id=book_id, **totals)
+                for (day, book_id), totals in circulation.items()
+            ),
+            batch_size=1000,
+        )
+        DailyPaymentTotal.objects.bulk_create(
+            (
+                DailyPaymentTotal(
+                    day=day, type=payment_type, status=status, **totals
+                )
+                for (day, payment_type, status), totals in payments.items()
+            ),
+            batch_size=1000,
+        )
+    return len(circulation), len(payments)
@@ -0,0 +1,144 @@
+import random
+import time
+import uuid
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PaymentServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = ("Payment service is temporarily unavailable, "
+                      "please try again later.")
+    default_code = "payment_service_unavailable"
+
+
+class CircuitBreaker:
+    """
+    Failure counter kept in the Django cache.
+
+    With a shared cache backend (Redis, Memcached, database) the state is
+    shared by every gunicorn worker, so once one worker sees Stripe failing
+    the others stop waiting on it as well.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout, window):
+        self.failures_key = f"circuit:{name}:failures"
+        self.open_until_key = f"circuit:{name}:open_until"
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.window = window
+
+    @property
+    def is_open(self):
+        open_until = cache.get(self.open_until_key)
+        return open_until is not None and time.time() < open_until
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.open_until_key])
+
+    def record_failure(self):
+        # add() is a no-op if the key exists, so the window is not extended
+        cache.add(self.failures_key, 0, self.window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            # The key expired between add() and incr()
+            cache.set(self.failures_key, 1, self.window)
+            failures = 1
+        if failures >= self.failure_threshold:
+            cache.set(
+                self.open_until_key,
+                time.time() + self.reset_timeout,
+                self.reset_timeout
+            )
+
+
+def get_circuit_breaker():
+    return CircuitBreaker(
+        "stripe",
+        failure_threshold=settings.STRIPE_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.STRIPE_BREAKER_RESET_TIMEOUT,
+        window=settings.STRIPE_BREAKER_WINDOW,
+    )
+
+
+def _configure_http_client():
+    """Give the stripe library a pooled client with our timeout"""
+    client = stripe.default_http_client
+    if (
+        isinstance(client, stripe.RequestsClient)
+        and client._timeout == settings.STRIPE_TIMEOUT
+    ):
+        return
+    stripe.default_http_client = stripe.RequestsClient(
+        timeout=settings.STRIPE_TIMEOUT
+    )
+    # Retries are done here, with jitter and a total budget
+    stripe.max_network_retries = 0
+
+
+def _is_retryable(error):
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return isinstance(error, stripe.APIError) and (
+        error.http_status is None or error.http_status >= 500
+    )
+
+
+def _backoff(attempt):
+    """Full jitter exponential backoff"""
+    return random.uniform(0, settings.STRIPE_RETRY_BACKOFF * 2 ** attempt)
+
+
+def call_stripe(method, *args, **kwargs):
+    """
+    Call a stripe library method with timeouts, retries and the breaker.
+
+    Raises PaymentServiceUnavailable when the breaker is open or Stripe
+    keeps failing within the STRIPE_TIMEOUT_BUDGET. Errors caused by the
+    request itself (invalid params, auth) are raised unchanged and do not
+    count as Stripe failures.
+    """
+    breaker = get_circuit_breaker()
+    if breaker.is_open:
+        raise PaymentServiceUnavailable()
+
+    _configure_http_client()
+    deadline = time.monotonic() + settings.STRIPE_TIMEOUT_BUDGET
+    attempt = 0
+    while True:
+        try:
+            result = method(*args, **kwargs)
+        except stripe.StripeError as error:
+            if not _is_retryable(error):
+                raise
+            breaker.record_failure()
+            delay = _backoff(attempt)
+            attempt += 1
+            out_of_budget = (
+                time.monotonic() + delay + settings.STRIPE_TIMEOUT > deadline
+            )
+            if (
+                attempt > settings.STRIPE_MAX_RETRIES
+                or out_of_budget
+                or breaker.is_open
+            ):
+                raise PaymentServiceUnavailable() from error
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+def create_checkout_session(**params):
+    # The idempotency key makes our own retries safe on Stripe's side
+    params.setdefault("idempotency_key", str(uuid.uuid4()))
+    return call_stripe(stripe.checkout.Session.create, **params)
+
+
+def retrieve_checkout_session(session_id):
+    return call_stripe(stripe.checkout.Session.retrieve, session_id)
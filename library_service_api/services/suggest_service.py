@@ -0,0 +1,124 @@
+import random
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from library_service_api.models import Book
+
+VERSION_KEY = "books:suggest:version"
+
+
+def normalize(text):
+    """Case-, accent- and whitespace-insensitive form used for matching"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    )
+    return " ".join(stripped.split())
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized titles and authors.
+
+    A lookup is a binary search for the prefix followed by a scan of the
+    matching run, so it costs O(log n + limit) no matter how many books
+    there are. Keys live in one sorted list with the book ids in a
+    parallel int array; titles and authors for the response are kept
+    once per book.
+    """
+
+    def __init__(self, rows):
+        pairs = []
+        self.books = {}
+        for book_id, title, author in rows:
+            self.books[book_id] = (title, author)
+            pairs.append((normalize(title), book_id))
+            pairs.append((normalize(author), book_id))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = array("q", (book_id for _, book_id in pairs))
+
+    def __len__(self):
+        return len(self.books)
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = {}
+        position = bisect_left(self.keys, prefix)
+        while (
+                position < len(self.keys)
+                and len(found) < limit
+                and self.keys[position].startswith(prefix)
+        ):
+            book_id = self.ids[position]
+            if book_id not in found:
+                title, author = self.books[book_id]
+                found[book_id] = {
+                    "id": book_id, "title": title, "author": author
+                }
+            position += 1
+        return list(found.values())
+
+
+def _new_version():
+    # Random rather than 0, so a cache that lost the key (restart,
+    # eviction) never matches an index built before
+    return random.getrandbits(62)
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every worker rebuild its index on its next lookup"""
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, _new_version(), None)
+
+    transaction.on_commit(bump)
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    This worker's index, built on first use.
+
+    Book edits bump a version in the cache, so with a shared cache
+    backend every worker notices and rebuilds (once) on its next lookup.
+    While one thread rebuilds, the others keep answering from the
+    previous index instead of waiting for it; only the first build
+    makes them wait.
+    """
+    global _index, _index_version
+    version = current_version()
+    if _index is not None and _index_version == version:
+        return _index
+    if not _index_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index is None or _index_version != version:
+            rows = Book.objects.order_by().values_list(
+                "id", "title", "author"
+            ).iterator(chunk_size=10000)
+            _index, _index_version = PrefixIndex(rows), version
+    finally:
+        _index_lock.release()
+    return _index
@@ -1,21 +1,199 @@
-import os
+import atexit
+import logging
+import threading
+import time
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n———\n\n"
+
+
+class TokenBucket:
+    """Allow `rate` events per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        current = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (current - self.updated) * self.rate
+        )
+        self.updated = current
+
+    def try_acquire(self):
+        with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+    def pause(self, seconds):
+        """Drain the bucket so nothing is sent for `seconds`"""
+        with self.lock:
+            self._refill()
+            self.tokens = -seconds * self.rate
+
+
+def build_digests(messages):
+    """Join messages into as few Telegram-sized texts as possible"""
+    digests, current = [], ""
+    for message in messages:
+        message = message[:MAX_MESSAGE_LENGTH]
+        candidate = (
+            f"{current}{DIGEST_SEPARATOR}{message}" if current else message
+        )
+        if len(candidate) > MAX_MESSAGE_LENGTH:
+            digests.append(current)
+            candidate = message
+        current = candidate
+    if current:
+        digests.append(current)
+    return digests
+
+
+class TelegramNotifier:
+    """
+    Coalesce notifications into digest messages.
+
+    Messages are buffered and sent every `window` seconds as one digest
+    (or a few, if they exceed Telegram's message size). Each digest takes
+    a token from the bucket; what does not fit in the rate limit stays
+    buffered for the next window. A window of 0 sends on every call.
+    """
+
+    def __init__(self, token, chat_id, api_base, window, rate, burst,
+                 max_buffer=1000):
+        self.url = f"{api_base}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.window = window
+        self.bucket = TokenBucket(rate, burst)
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=4))
+
+    def notify(self, message):
+        with self.lock:
+            self.buffer.append(message)
+            dropped = len(self.buffer) - self.max_buffer
+            if dropped > 0:
+                del self.buffer[:dropped]
+                logger.warning(
+                    "Telegram buffer full, dropped %s messages", dropped
+                )
+        if not self.window:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        # Started lazily so that every forked gunicorn worker gets its own
+        if self.flusher is None or not self.flusher.is_alive():
+            self.flusher = threading.Thread(
+                target=self._run,
+                name="telegram-digest",
+                daemon=True
+            )
+            self.flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Telegram digest flush failed")
+
+    def flush(self):
+        """Send buffered messages as digests, within the rate limit"""
+        with self.lock:
+            messages, self.buffer = self.buffer, []
+        if not messages:
+            return
+
+        digests = build_digests(messages)
+        for index, digest in enumerate(digests):
+            if not self.bucket.try_acquire() or not self._send(digest):
+                self._requeue(digests[index:])
+                return
+
+    def _requeue(self, digests):
+        with self.lock:
+            self.buffer[:0] = digests
+
+    def _send(self, text):
+        """Post one message, returns False if it should be retried"""
+        try:
+            response = self.session.post(
+                self.url,
+                data={"chat_id": self.chat_id, "text": text},
+                timeout=5,
+            )
+        except requests.RequestException as error:
+            logger.warning("Telegram send error: %s", error)
+            return False
+
+        if response.status_code == 429:
+            try:
+                retry_after = response.json()["parameters"]["retry_after"]
+            except (ValueError, KeyError, TypeError):
+                retry_after = self.window or 1
+            self.bucket.pause(retry_after)
+            logger.warning(
+                "Telegram rate limit hit, retrying in %s s", retry_after
+            )
+            return False
+        if not response.ok:
+            # Anything else will not get better by retrying
+            logger.error(
+                "Telegram rejected message: %s %s",
+                response.status_code,
+                response.text
+            )
+        return True
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = TelegramNotifier(
+                token=settings.TELEGRAM_BOT_TOKEN,
+                chat_id=settings.TELEGRAM_CHAT_ID,
+                api_base=settings.TELEGRAM_API_BASE,
+                window=settings.TELEGRAM_DIGEST_WINDOW,
+                rate=settings.TELEGRAM_RATE_PER_MINUTE / 60,
+                burst=settings.TELEGRAM_RATE_BURST,
+            )
+            atexit.register(_notifier.flush)
+    return _notifier
 
 
 def send_telegram_message(message: str) -> None:
     """
-    Send a message to Telegram chat using Bot API.
+    Queue a message for the Telegram chat using Bot API.
     """
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+    if not settings.TELEGRAM_BOT_TOKEN or not settings.TELEGRAM_CHAT_ID:
         return
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-
-    try:
-        requests.post(url, data=payload, timeout=5)
-    except requests.RequestException as e:
-        print(f"Telegram send error: {e}")
+    get_notifier().notify(message)
@@ -0,0 +1,144 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Power
+from django.utils import timezone
+
+from library_service_api.models import Book, Borrowing, JobCheckpoint
+
+EPOCH_CHECKPOINT = "trending:epoch"
+# Scores that decayed below this are reset to 0 on renormalization
+NEGLIGIBLE_SCORE = 1e-3
+
+
+def _half_life_seconds():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def get_epoch():
+    """Unix time all stored trending scores are relative to"""
+    epoch = JobCheckpoint.get_value(EPOCH_CHECKPOINT)
+    if epoch is None:
+        epoch = time.time()
+        JobCheckpoint.set_value(EPOCH_CHECKPOINT, str(epoch))
+    return float(epoch)
+
+
+def weight_at(timestamp, epoch):
+    """
+    Weight of a borrow made at `timestamp`.
+
+    Instead of decaying every score as time passes, newer borrows get
+    exponentially larger weights (2 ** (age of epoch / half-life)). The
+    ratio between any two scores is then the same as with decayed
+    scores, so ordering by the stored column is correct at any moment
+    and a borrow is a single O(1) increment.
+    """
+    return 2 ** ((timestamp - epoch) / _half_life_seconds())
+
+
+def current_scale(epoch):
+    """Factor turning stored scores into decayed borrow counts as of now"""
+    return weight_at(epoch, time.time())
+
+
+def _add_borrow(book_id, timestamp):
+    # weight_at(timestamp, epoch) in the UPDATE itself, so the epoch
+    # checkpoint is not a separate read; 1 until an epoch exists
+    epoch = JobCheckpoint.objects.filter(
+        name=EPOCH_CHECKPOINT
+    ).values("value")
+    weight = Power(
+        Value(2.0),
+        (Value(timestamp) - Cast(Subquery(epoch), FloatField()))
+        / Value(float(_half_life_seconds())),
+    )
+    Book.objects.filter(pk=book_id).update(
+        trending_score=F("trending_score") + Coalesce(weight, Value(1.0))
+    )
+
+
+def count_borrow(borrowing):
+    """
+    Add the borrow to its book's trending score once its transaction
+    commits.
+
+    Inside the borrow transaction the Book row would stay locked until
+    the commit, and borrows of a sharded title would queue on it again.
+    A rolled back borrow is not counted; a crash in between loses one
+    borrow, which `rebuild` recomputes.
+    """
+    transaction.on_commit(
+        lambda: _add_borrow(borrowing.book_id, time.time())
+    )
+
+
+def renormalize():
+    """
+    Rescale every score to a new epoch of now.
+
+    Weights grow without bound as time moves away from the epoch, so
+    this has to run periodically (daily is plenty) to keep the floats
+    in range. Scores that decayed to nothing are reset to 0, which
+    also keeps them out of the trending list. Returns the scale applied.
+    """
+    get_epoch()
+    with transaction.atomic():
+        checkpoint = JobCheckpoint.objects.select_for_update().get(
+            name=EPOCH_CHECKPOINT
+        )
+        new_epoch = time.time()
+        scale = weight_at(float(checkpoint.value), new_epoch)
+        Book.objects.filter(trending_score__gt=0).update(
+            trending_score=F("trending_score") * scale
+        )
+        Book.objects.filter(
+            trending_score__gt=0,
+            trending_score__lt=NEGLIGIBLE_SCORE
+        ).update(trending_score=0)
+        checkpoint.value = str(new_epoch)
+        checkpoint.save(update_fields=["value", "updated_at"])
+    return scale
+
+
+def rebuild():
+    """
+    Recompute every score from the borrowing history.
+
+    Needed once to backfill, and after changing the half-life, since
+    stored scores were accumulated with the old one. Borrows only have a
+    date, so each counts from the start of its day. Returns the number
+    of books with a score.
+    """
+    new_epoch = time.time()
+    scores = defaultdict(float)
+    rows = (
+        Borrowing.objects.order_by()
+        .values("book_id", "borrow_date")
+        .annotate(total=Count("id"))
+    )
+    for row in rows:
+        borrowed_at = timezone.make_aware(
+            datetime.combine(row["borrow_date"], datetime.min.time())
+        ).timestamp()
+        scores[row["book_id"]] += (
+            row["total"] * weight_at(borrowed_at, new_epoch)
+        )
+
+    with transaction.atomic():
+        Book.objects.filter(trending_score__gt=0).update(trending_score=0)
+        Book.objects.bulk_update(
+            [
+                Book(pk=book_id, trending_score=score)
+                for book_id, score in scores.items()
+                if score >= NEGLIGIBLE_SCORE
+            ],
+            ["trending_score"],
+            batch_size=1000,
+        )
+        JobCheckpoint.set_value(EPOCH_CHECKPOINT, str(new_epoch))
+    return len(scores)
@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from library_service_api.models import Book
+from library_service_api.services.suggest_service import invalidate
+
+SUGGEST_FIELDS = {"title", "author"}
+
+
+def _suggest_fields_changed(book):
+    """Whether a save wrote a title or author other than the loaded one"""
+    loaded = getattr(book, "_loaded_values", None)
+    if loaded is None:
+        # Not loaded from the database, nothing to compare with
+        return True
+    changed = any(
+        name in book.__dict__ and book.__dict__[name] != loaded.get(name)
+        for name in SUGGEST_FIELDS
+    )
+    loaded.update(
+        (name, book.__dict__[name])
+        for name in SUGGEST_FIELDS if name in book.__dict__
+    )
+    return changed
+
+
+@receiver(pre_save, sender=Book)
+def book_loading(sender, instance, raw=False, **kwargs):
+    # loaddata saves raw, past Book.save(); a fixture without totals
+    # would otherwise load every book with none
+    if raw:
+        instance.fill_total_copies()
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    # Stock and shard changes save with update_fields, full saves (API
+    # and admin edits) usually leave title and author as they were
+    if update_fields is not None and not SUGGEST_FIELDS & set(update_fields):
+        return
+    if created or raw or _suggest_fields_changed(instance):
+        invalidate()
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    invalidate()
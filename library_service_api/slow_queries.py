@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from library_service_api.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def fingerprint(sql):
+    """
+    Normalize a statement so that queries differing only in literal
+    values or IN-list length share one fingerprint.
+
+    Returns (fingerprint, normalized sql).
+    """
+    normalized = _STRING.sub("?", sql)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    normalized = _SPACE.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest(), normalized
+
+
+def explain(sql, params):
+    """The plan of a statement without running it"""
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE off) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join(
+            " ".join(str(column) for column in row)
+            for row in cursor.fetchall()
+        )
+
+
+class SlowQueryRecorder:
+    """
+    Connection execute_wrapper timing every statement of one request.
+
+    Slow statements are only collected here; they are written by
+    flush() once the request is done, so logging never runs inside the
+    request's transactions or adds writes between its statements.
+    """
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold_ms = threshold_ms
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= self.threshold_ms and not many:
+                self.slow.append((sql, params, elapsed_ms))
+
+    @property
+    def view(self):
+        match = getattr(self.request, "resolver_match", None)
+        if match is not None:
+            return match.view_name or match.route
+        return self.request.path
+
+    def _plan(self, sql, params, normalized):
+        if not normalized.upper().startswith(_EXPLAINABLE):
+            return ""
+        try:
+            with transaction.atomic():
+                return explain(sql, params)
+        except DatabaseError as error:
+            return f"EXPLAIN failed: {error}"
+
+    def flush(self):
+        """
+        Add the slow statements to their fingerprint rows.
+
+        A new fingerprint always gets its plan; known ones are
+        re-explained for a sample of calls so plans follow index and
+        statistics changes.
+        """
+        view = self.view[:255]
+        for sql, params, elapsed_ms in self.slow:
+            key, normalized = fingerprint(sql)
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s", elapsed_ms, view, normalized
+            )
+            updates = {
+                "calls": F("calls") + 1,
+                "total_ms": F("total_ms") + elapsed_ms,
+                "max_ms": Greatest(F("max_ms"), elapsed_ms),
+                "view": view,
+            }
+            if random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+                updates["plan"] = self._plan(sql, params, normalized)
+            if SlowQuery.objects.filter(fingerprint=key).update(**updates):
+                continue
+            SlowQuery.objects.get_or_create(
+                fingerprint=key,
+                defaults={
+                    "sql": normalized,
+                    "view": view,
+                    "calls": 1,
+                    "total_ms": elapsed_ms,
+                    "max_ms": elapsed_ms,
+                    "plan": updates.get("plan")
+                    or self._plan(sql, params, normalized),
+                },
+            )
+        if self.slow:
+            prune()
+
+
+def prune():
+    """Keep only the SLOW_QUERY_MAX_ENTRIES costliest fingerprints"""
+    stale = list(
+        SlowQuery.objects.order_by("-total_ms").values_list(
+            "pk", flat=True
+        )[settings.SLOW_QUERY_MAX_ENTRIES:]
+    )
+    if stale:
+        SlowQuery.objects.filter(pk__in=stale).delete()
+
+
+class SlowQueryMiddleware:
+    """
+    Opt-in slow query log, enabled by SLOW_QUERY_THRESHOLD_MS.
+
+    Statements slower than the threshold are logged with the view that
+    ran them and aggregated per fingerprint in SlowQuery, together with
+    an EXPLAIN plan for a sample of them (SLOW_QUERY_EXPLAIN_SAMPLE_RATE).
+    `manage.py slow_queries` lists the worst ones.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold_ms = settings.SLOW_QUERY_THRESHOLD_MS
+        if not threshold_ms:
+            return self.get_response(request)
+
+        recorder = SlowQueryRecorder(request, threshold_ms)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        try:
+            recorder.flush()
+        except DatabaseError:
+            logger.exception("Could not store slow queries")
+        return response
@@ -1,14 +1,75 @@
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
 from datetime import date, timedelta
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock
 
+import stripe
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from rest_framework.test import APIClient
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.serializers import deserialize
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
 from django.urls import reverse
+from django.utils.timezone import now
 
-from library_service_api.models import Book, Borrowing, Payment
+from library_service import health, schema
+from library_service.schema import schema_file
+from library_service_api.filters import BorrowingFilter, PaymentFilter
+from library_service_api.idempotency import _request_fingerprint
+from library_service_api.pagination import (
+    EstimatedCountLimitOffsetPagination
+)
+from library_service_api.models import (ArchivedBorrowing,
+                                        Book,
+                                        BookInventorySlot,
+                                        Borrowing,
+                                        IdempotencyKey,
+                                        Payment,
+                                        SlowQuery)
+from library_service_api.serializers import BookSerializer
+from library_service_api.services import suggest_service
+from library_service_api.services.fake_stripe import FakeStripeServer
+from library_service_api.slow_queries import fingerprint
+from library_service_api.services.inventory_service import (
+    available_inventory,
+    find_drift,
+    set_inventory,
+    set_shards,
+    take_copy
+)
+from library_service_api.services.recommendation_service import (
+    neighbors_for
+)
+from library_service_api.services.stripe_client import (
+    PaymentServiceUnavailable,
+    call_stripe
+)
+from library_service_api.services.telegram_service import (
+    MAX_MESSAGE_LENGTH,
+    TelegramNotifier
+)
+from library_service_api.services.trending_service import (
+    count_borrow,
+    get_epoch
+)
+from library_service_api.views import BULK_RETURN_FINE_LIMIT
 
 
 BOOKS_URL = reverse("library_service_api:books-list")
@@ -189,9 +250,13 @@ class PaymentApiTests(TestCase):
     def test_list_payments_for_user(self):
         res = self.client.get(PAYMENTS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 4)
+        self.assertEqual(len(res.data), 5)
+        self.assertFalse(res.data["count_is_estimate"])
 
-    @patch("library_service_api.views.stripe.checkout.Session.retrieve")
+    @patch(
+        "library_service_api.services.stripe_client"
+        ".stripe.checkout.Session.retrieve"
+    )
     def test_payment_success_marks_as_paid(self, mock_retrieve):
         mock_retrieve.return_value.payment_status = "paid"
         url = reverse("library_service_api:payments-success")
@@ -211,3 +276,1991 @@ class PaymentApiTests(TestCase):
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn("cancelled", res.data["detail"].lower())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="retry@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Retry Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=3
+        )
+        self.payload = {
+            "book_id": self.book.id,
+            "expected_return_date": (
+                    date.today() + timedelta(days=2)
+            ).isoformat()
+        }
+
+    @patch("library_service_api.serializers.create_stripe_session")
+    @patch("library_service_api.serializers.send_telegram_message")
+    def test_retried_borrow_is_replayed(self, mock_telegram, mock_stripe):
+        first = self.client.post(
+            BORROWINGS_URL, self.payload, format="json",
+            HTTP_IDEMPOTENCY_KEY="borrow-1"
+        )
+        second = self.client.post(
+            BORROWINGS_URL, self.payload, format="json",
+            HTTP_IDEMPOTENCY_KEY="borrow-1"
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data["id"], second.data["id"])
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+        mock_stripe.assert_called_once()
+        mock_telegram.assert_called_once()
+
+    @patch("library_service_api.serializers.create_stripe_session")
+    @patch("library_service_api.serializers.send_telegram_message")
+    def test_key_reused_for_other_request(self, mock_telegram, mock_stripe):
+        self.client.post(
+            BORROWINGS_URL, self.payload, format="json",
+            HTTP_IDEMPOTENCY_KEY="borrow-2"
+        )
+        self.payload["expected_return_date"] = (
+                date.today() + timedelta(days=4)
+        ).isoformat()
+        res = self.client.post(
+            BORROWINGS_URL, self.payload, format="json",
+            HTTP_IDEMPOTENCY_KEY="borrow-2"
+        )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    @patch("library_service_api.views.send_telegram_message")
+    def test_retried_return_is_replayed(self, mock_telegram):
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=1),
+            book=self.book,
+            user=self.user
+        )
+        url = reverse(
+            "library_service_api:borrowings-return",
+            args=[borrowing.id]
+        )
+
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY="return-1")
+        second = self.client.post(url, HTTP_IDEMPOTENCY_KEY="return-1")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+        mock_telegram.assert_called_once()
+
+    def _post_borrow(self, key):
+        return self.client.post(
+            BORROWINGS_URL, self.payload, format="json",
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    @patch("library_service_api.serializers.create_stripe_session")
+    @patch("library_service_api.serializers.send_telegram_message")
+    def test_abandoned_claim_is_taken_over(self, *mocks):
+        fingerprint = _request_fingerprint(MagicMock(
+            method="POST", path=BORROWINGS_URL, data=self.payload
+        ))
+        for key in ("borrow-live", "borrow-abandoned"):
+            IdempotencyKey.objects.create(
+                user=self.user, key=key, request_fingerprint=fingerprint
+            )
+        IdempotencyKey.objects.filter(key="borrow-abandoned").update(
+            created_at=now() - settings.IDEMPOTENCY_CLAIM_LEASE
+            - timedelta(seconds=1)
+        )
+
+        live = self._post_borrow("borrow-live")
+        abandoned = self._post_borrow("borrow-abandoned")
+        replayed = self._post_borrow("borrow-abandoned")
+
+        self.assertEqual(live.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(abandoned.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replayed["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    @patch("library_service_api.serializers.send_telegram_message")
+    def test_request_past_its_lease_keeps_the_new_claim(self, _):
+        def taken_over(*args, **kwargs):
+            # Another request took the key over meanwhile
+            IdempotencyKey.objects.filter(key="borrow-slow").delete()
+            IdempotencyKey.objects.create(
+                user=self.user, key="borrow-slow", request_fingerprint="new"
+            )
+
+        with patch("library_service_api.serializers.create_stripe_session",
+                   side_effect=taken_over):
+            res = self._post_borrow("borrow-slow")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        record = IdempotencyKey.objects.get(key="borrow-slow")
+        self.assertEqual(record.request_fingerprint, "new")
+        self.assertFalse(record.is_completed)
+
+    def test_claim_lost_every_round_is_a_conflict(self):
+        # Every insert collides with a row that is gone again on lookup
+        with patch.object(
+                IdempotencyKey.objects, "create", side_effect=IntegrityError
+        ):
+            res = self.client.post(
+                BORROWINGS_URL, self.payload, format="json",
+                HTTP_IDEMPOTENCY_KEY="borrow-contended"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Borrowing.objects.count(), 0)
+
+
+@override_settings(
+    STRIPE_MAX_RETRIES=1,
+    STRIPE_RETRY_BACKOFF=0,
+    STRIPE_BREAKER_FAILURE_THRESHOLD=3,
+)
+class StripeClientTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="outage@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Outage Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=1
+        )
+
+    def test_retries_transient_errors(self):
+        method = MagicMock(
+            side_effect=[stripe.APIConnectionError("timeout"), "session"]
+        )
+        self.assertEqual(call_stripe(method), "session")
+        self.assertEqual(method.call_count, 2)
+
+    def test_request_errors_are_not_retried(self):
+        method = MagicMock(
+            side_effect=stripe.InvalidRequestError("bad", param="x")
+        )
+        with self.assertRaises(stripe.InvalidRequestError):
+            call_stripe(method)
+        method.assert_called_once()
+
+    def test_breaker_opens_and_fails_fast(self):
+        method = MagicMock(side_effect=stripe.APIConnectionError("down"))
+        with self.assertRaises(PaymentServiceUnavailable):
+            call_stripe(method)
+        with self.assertRaises(PaymentServiceUnavailable):
+            call_stripe(method)
+        calls = method.call_count
+
+        with self.assertRaises(PaymentServiceUnavailable):
+            call_stripe(method)
+        self.assertEqual(method.call_count, calls)
+
+    @patch("library_service_api.serializers.send_telegram_message")
+    @patch(
+        "library_service_api.services.stripe_client"
+        ".stripe.checkout.Session.create"
+    )
+    def test_borrow_rolled_back_when_stripe_down(
+            self, mock_create, mock_telegram
+    ):
+        mock_create.side_effect = stripe.APIConnectionError("down")
+        payload = {
+            "book_id": self.book.id,
+            "expected_return_date": (
+                    date.today() + timedelta(days=2)
+            ).isoformat()
+        }
+        res = self.client.post(BORROWINGS_URL, payload, format="json")
+
+        self.assertEqual(
+            res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+        self.assertFalse(Borrowing.objects.exists())
+        mock_telegram.assert_not_called()
+
+
+class ShardedInventoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="shard@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = set_shards(
+            Book.objects.create(
+                title="Bestseller",
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=5
+            ),
+            shards=3
+        )
+
+    def test_set_shards_keeps_inventory(self):
+        counts = list(
+            BookInventorySlot.objects.filter(book=self.book)
+            .values_list("count", flat=True)
+        )
+        self.assertEqual(counts, [2, 2, 1])
+        self.assertEqual(available_inventory(self.book), 5)
+
+        book = set_shards(self.book, 0)
+        self.assertEqual(book.inventory, 5)
+        self.assertFalse(BookInventorySlot.objects.exists())
+
+    def test_take_copy_drains_all_slots(self):
+        taken = [take_copy(self.book) for _ in range(6)]
+
+        self.assertEqual(taken, [True] * 5 + [False])
+        self.assertEqual(available_inventory(self.book), 0)
+
+    def test_book_api_reports_summed_inventory(self):
+        res = self.client.get(
+            reverse("library_service_api:books-detail", args=[self.book.id])
+        )
+        self.assertEqual(res.data["inventory"], 5)
+
+    @patch("library_service_api.views.send_telegram_message")
+    @patch("library_service_api.serializers.create_stripe_session")
+    @patch("library_service_api.serializers.send_telegram_message")
+    def test_borrow_and_return_sharded_book(self, *mocks):
+        payload = {
+            "book_id": self.book.id,
+            "expected_return_date": (
+                    date.today() + timedelta(days=2)
+            ).isoformat()
+        }
+        res = self.client.post(BORROWINGS_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(available_inventory(self.book), 4)
+
+        res = self.client.post(reverse(
+            "library_service_api:borrowings-return",
+            args=[res.data["id"]]
+        ))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(available_inventory(self.book), 5)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@example.com", "adminpass123"
+        )
+        self.client.force_login(self.admin)
+        self.book = Book.objects.create(
+            title="Admin Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=100
+        )
+
+    def _add_borrowings(self, count):
+        for i in range(count):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=date.today() + timedelta(days=1),
+                book=self.book,
+                user=create_user(
+                    email=f"reader{Borrowing.objects.count()}@example.com",
+                    password="pass12345"
+                )
+            )
+            Payment.objects.create(
+                borrowing=borrowing,
+                session_url="http://test.com/s",
+                session_id=f"admin-sess-{borrowing.id}",
+                money_to_pay=Decimal("1.00")
+            )
+
+    def _changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for model in ("borrowing", "payment"):
+            url = reverse(f"admin:library_service_api_{model}_changelist")
+            self._add_borrowings(1)
+            few = self._changelist_queries(url)
+            self._add_borrowings(5)
+            many = self._changelist_queries(url)
+            self.assertEqual(few, many, model)
+
+
+@override_settings(EXACT_COUNT_THRESHOLD=3)
+class EstimatedCountPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="counter@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(4):
+            Book.objects.create(
+                title=f"Count Book {i}",
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=1
+            )
+
+    def test_small_result_is_exact(self):
+        res = self.client.get(BOOKS_URL)
+        self.assertEqual(res.data["count"], 4)
+        self.assertFalse(res.data["count_is_estimate"])
+
+    def test_large_count_is_reused_and_flagged(self):
+        self.client.get(BOOKS_URL)
+        Book.objects.create(
+            title="Late Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=1
+        )
+        res = self.client.get(BOOKS_URL)
+
+        self.assertEqual(res.data["count"], 4)
+        self.assertTrue(res.data["count_is_estimate"])
+
+    def _add_books(self, count):
+        for i in range(count):
+            Book.objects.create(
+                title=f"Late Book {i:02}",
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=1
+            )
+
+    def test_low_estimate_loses_no_rows(self):
+        self.client.get(BOOKS_URL)
+        self._add_books(17)
+
+        first = self.client.get(BOOKS_URL)
+        last = self.client.get(BOOKS_URL, {"page": 3})
+        past = self.client.get(BOOKS_URL, {"page": 4})
+
+        self.assertTrue(first.data["count_is_estimate"])
+        self.assertEqual(len(first.data["results"]), 10)
+        self.assertIsNotNone(first.data["next"])
+        self.assertEqual(len(last.data["results"]), 1)
+        self.assertIsNone(last.data["next"])
+        self.assertEqual(past.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_low_estimate_limit_offset_reads_past_it(self):
+        pagination = EstimatedCountLimitOffsetPagination()
+        request = Request(APIRequestFactory().get("/", {"limit": 3}))
+        pagination.paginate_queryset(Book.objects.all(), request)
+        self._add_books(17)
+
+        request = Request(
+            APIRequestFactory().get("/", {"limit": 3, "offset": 15})
+        )
+        rows = pagination.paginate_queryset(Book.objects.all(), request)
+
+        self.assertTrue(pagination.count_is_estimate)
+        self.assertEqual(len(rows), 3)
+        self.assertIn("offset=18", pagination.get_next_link())
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="sparse@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Sparse Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=10
+        )
+
+    def _borrow(self, count):
+        for i in range(count):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=date.today() + timedelta(days=1),
+                book=self.book,
+                user=self.user
+            )
+            Payment.objects.create(
+                borrowing=borrowing,
+                session_url="http://test.com/s",
+                session_id=f"sparse-{borrowing.id}",
+                money_to_pay=Decimal("1.00")
+            )
+
+    def test_fields_trims_payload(self):
+        self._borrow(1)
+        res = self.client.get(
+            BORROWINGS_URL, {"fields": "id,borrow_date"}
+        )
+        self.assertEqual(
+            set(res.data["results"][0]), {"id", "borrow_date"}
+        )
+
+    def test_expand_embeds_objects(self):
+        self._borrow(1)
+        res = self.client.get(BORROWINGS_URL, {"expand": "book,user"})
+        result = res.data["results"][0]
+
+        self.assertEqual(result["book"]["title"], self.book.title)
+        self.assertEqual(result["user"]["email"], self.user.email)
+
+    def test_expand_does_not_add_queries_per_row(self):
+        for params in ({}, {"expand": "borrowing"}):
+            self._borrow(1)
+            with CaptureQueriesContext(connection) as few:
+                self.client.get(PAYMENTS_URL, params)
+            self._borrow(3)
+            with CaptureQueriesContext(connection) as many:
+                res = self.client.get(PAYMENTS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                len(few.captured_queries), len(many.captured_queries)
+            )
+
+    def test_expanded_books_are_annotated(self):
+        self._borrow(1)
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(BORROWINGS_URL)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(BORROWINGS_URL, {"expand": "book"})
+        for index in range(4):
+            book = Book.objects.create(
+                title=f"Gone {index}",
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=1
+            )
+            if index % 2:
+                book = set_shards(book, shards=2)
+            Borrowing.objects.create(
+                expected_return_date=date.today() + timedelta(days=1),
+                book=book,
+                user=self.user
+            )
+            take_copy(book)
+        with CaptureQueriesContext(connection) as many:
+            res = self.client.get(BORROWINGS_URL, {"expand": "book"})
+
+        self.assertEqual(
+            len(few.captured_queries), len(plain.captured_queries) + 1
+        )
+        self.assertEqual(
+            len(few.captured_queries), len(many.captured_queries)
+        )
+        expanded = [item["book"] for item in res.data["results"]]
+        gone = [book for book in expanded if book["title"][:4] == "Gone"]
+        self.assertEqual([book["inventory"] for book in gone], [0] * 4)
+        self.assertTrue(all(book["next_available_date"] for book in gone))
+
+
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        health._last_check = None
+
+    def test_healthz(self):
+        res = self.client.get(reverse("healthz"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_readyz_reuses_database_check(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse("readyz"))
+            res = self.client.get(reverse("readyz"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["database"], "ok")
+
+    @patch("library_service_api.management.commands.wait_for_db.time.sleep")
+    @patch("django.db.backends.base.base.BaseDatabaseWrapper"
+           ".ensure_connection")
+    def test_wait_for_db_backs_off(self, mock_connect, mock_sleep):
+        mock_connect.side_effect = [OperationalError] * 4 + [None]
+        call_command("wait_for_db", stdout=MagicMock())
+
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 4)
+        self.assertEqual(delays, sorted(delays))
+
+    @patch("library_service_api.management.commands.wait_for_db.time.sleep")
+    @patch("django.db.backends.base.base.BaseDatabaseWrapper"
+           ".ensure_connection", side_effect=OperationalError)
+    def test_wait_for_db_times_out(self, mock_connect, mock_sleep):
+        with self.assertRaises(CommandError):
+            call_command("wait_for_db", timeout=0, stdout=MagicMock())
+
+
+class SchemaCacheTests(TestCase):
+    def setUp(self):
+        schema._schemas.clear()
+        self.url = reverse("schema")
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(SCHEMA_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _get_generated(self):
+        with patch(
+            "drf_spectacular.generators.SchemaGenerator.get_schema",
+            return_value={"openapi": "3.0.3"}
+        ) as mock_generate:
+            res = self.client.get(self.url)
+        return res, mock_generate.called
+
+    def test_prebuilt_schema_served_for_its_version_only(self):
+        with override_settings(CODE_VERSION=None):
+            call_command("build_schema", stdout=StringIO())
+            schema_file("yaml").write_bytes(b"openapi: prebuilt\n")
+            res, generated = self._get_generated()
+
+        self.assertFalse(generated)
+        self.assertEqual(res.content, b"openapi: prebuilt\n")
+        self.assertEqual(schema.code_version(), schema._source_hash())
+
+        schema._schemas.clear()
+        with override_settings(CODE_VERSION="new"):
+            res, generated = self._get_generated()
+        self.assertTrue(generated)
+
+    def test_schema_generated_once(self):
+        with patch(
+            "drf_spectacular.generators.SchemaGenerator.get_schema",
+            return_value={"openapi": "3.0.3"}
+        ) as mock_generate:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        mock_generate.assert_called_once()
+
+    def test_etag_and_gzip(self):
+        res = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        server = self.server
+        if server.rate_limited:
+            server.rate_limited -= 1
+            self._reply(429, {
+                "ok": False,
+                "parameters": {"retry_after": 0},
+            })
+            return
+        server.messages.append(form["text"][0])
+        self._reply(200, {"ok": True})
+
+    def _reply(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TelegramDigestTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeBotApiHandler
+        )
+        self.server.messages = []
+        self.server.rate_limited = 0
+        threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        ).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _notifier(self, burst=5):
+        host, port = self.server.server_address
+        return TelegramNotifier(
+            token="test-token",
+            chat_id="42",
+            api_base=f"http://{host}:{port}",
+            window=60,
+            rate=0,
+            burst=burst,
+        )
+
+    def test_messages_in_window_are_sent_as_one_digest(self):
+        notifier = self._notifier()
+        for i in range(5):
+            notifier.buffer.append(f"Borrowing {i}")
+        notifier.flush()
+
+        self.assertEqual(len(self.server.messages), 1)
+        for i in range(5):
+            self.assertIn(f"Borrowing {i}", self.server.messages[0])
+
+    def test_rate_limit_keeps_messages_buffered(self):
+        notifier = self._notifier(burst=1)
+        notifier.buffer.extend(["a" * MAX_MESSAGE_LENGTH] * 3)
+        notifier.flush()
+
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(len(notifier.buffer), 2)
+
+    def test_telegram_429_requeues_digest(self):
+        self.server.rate_limited = 1
+        notifier = self._notifier()
+        notifier.buffer.append("Returned")
+        notifier.flush()
+
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(notifier.buffer, ["Returned"])
+
+
+class ArchivalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="history@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Old Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=5
+        )
+        long_ago = date.today() - timedelta(days=400)
+        self.settled = self._borrowing(long_ago, Payment.StatusChoices.PAID)
+        self.unpaid = self._borrowing(long_ago, Payment.StatusChoices.PENDING)
+        self.recent = self._borrowing(
+            date.today(), Payment.StatusChoices.PAID
+        )
+
+    def _borrowing(self, returned, payment_status):
+        borrowing = Borrowing.objects.create(
+            expected_return_date=returned,
+            actual_return_date=returned,
+            book=self.book,
+            user=self.user
+        )
+        Payment.objects.create(
+            borrowing=borrowing,
+            status=payment_status,
+            session_url="http://test.com/s",
+            session_id=f"history-{borrowing.id}",
+            money_to_pay=Decimal("1.00")
+        )
+        return borrowing
+
+    def test_archives_only_old_settled_borrowings(self):
+        call_command(
+            "archive_borrowings", batch_size=1, stdout=MagicMock()
+        )
+
+        self.assertEqual(
+            set(Borrowing.objects.values_list("id", flat=True)),
+            {self.unpaid.id, self.recent.id}
+        )
+        archived = ArchivedBorrowing.objects.get()
+        self.assertEqual(archived.id, self.settled.id)
+        self.assertEqual(archived.payments.count(), 1)
+
+    def test_history_reads_archive_only_when_asked(self):
+        call_command("archive_borrowings", stdout=MagicMock())
+
+        res = self.client.get(BORROWINGS_URL)
+        self.assertEqual(res.data["count"], 2)
+
+        res = self.client.get(BORROWINGS_URL, {"archived": "true"})
+        self.assertEqual(res.data["count"], 1)
+        self.assertEqual(res.data["results"][0]["id"], self.settled.id)
+
+        res = self.client.get(
+            PAYMENTS_URL, {"archived": "true", "expand": "borrowing"}
+        )
+        self.assertEqual(
+            res.data["results"][0]["borrowing"]["id"], self.settled.id
+        )
+
+
+@patch("library_service_api.serializers.send_telegram_message")
+@patch("library_service_api.services.payments_service"
+       ".create_checkout_session")
+class ReportingRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="staff@example.com", password="testpass123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Auth",
+            daily_fee=Decimal("2.00"),
+            inventory=5
+        )
+        self.summary_url = reverse("library_service_api:reports-summary")
+
+    def _borrow_and_pay(self, mock_session, session_id):
+        mock_session.return_value = MagicMock(
+            id=session_id, url="http://test.com/s"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(BORROWINGS_URL, {
+                "book_id": self.book.id,
+                "expected_return_date": (
+                        date.today() + timedelta(days=3)
+                ).isoformat()
+            }, format="json")
+        with patch(
+            "library_service_api.services.stripe_client"
+            ".stripe.checkout.Session.retrieve"
+        ) as mock_retrieve:
+            mock_retrieve.return_value.payment_status = "paid"
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(
+                    reverse("library_service_api:payments-success"),
+                    {"session_id": session_id}
+                )
+
+    def test_summary_from_incremental_rollups(self, mock_session, _):
+        self._borrow_and_pay(mock_session, "cs_report_1")
+        self._borrow_and_pay(mock_session, "cs_report_2")
+
+        with self.assertNumQueries(3):
+            res = self.client.get(self.summary_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["revenue"], Decimal("12.00"))
+        self.assertEqual(res.data["outstanding"], 0)
+        self.assertEqual(res.data["borrowed"], 2)
+        self.assertEqual(res.data["most_borrowed"][0]["borrowed"], 2)
+
+    def test_rebuild_matches_incremental(self, mock_session, _):
+        self._borrow_and_pay(mock_session, "cs_report_3")
+        before = self.client.get(self.summary_url).data
+
+        call_command("rebuild_rollups", stdout=MagicMock())
+
+        self.assertEqual(self.client.get(self.summary_url).data, before)
+
+    def test_summary_is_staff_only(self, *mocks):
+        self.user.is_staff = False
+        self.user.save()
+        res = self.client.get(self.summary_url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_summary_is_in_the_schema(self, *mocks):
+        generated = SchemaGenerator().get_schema(request=None, public=True)
+
+        operation = generated["paths"]["/api/library/reports/summary/"]["get"]
+        self.assertEqual(
+            operation["responses"]["200"]["content"]["application/json"]
+            ["schema"]["$ref"],
+            "#/components/schemas/ReportSummary"
+        )
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=5
+            )
+            for index in range(4)
+        ]
+        # Readers of book 0 also read book 1 more often than book 2
+        reader = self._reader("a@example.com", [0, 1, 2])
+        self._reader("b@example.com", [0, 1])
+        self._reader("c@example.com", [3])
+        self.client.force_authenticate(user=reader)
+
+    def _reader(self, email, books):
+        user = create_user(email=email, password="testpass123")
+        for index in books:
+            Borrowing.objects.create(
+                expected_return_date=date.today(),
+                book=self.books[index],
+                user=user
+            )
+        return user
+
+    def _related(self, book):
+        return self.client.get(
+            reverse("library_service_api:books-related", args=[book.id])
+        )
+
+    def test_related_books_ranked_by_co_borrowing(self):
+        call_command("build_recommendations", stdout=MagicMock())
+        # Neither makes the serializer query per neighbour
+        set_shards(self.books[1], shards=2)
+        Book.objects.filter(pk=self.books[2].pk).update(inventory=0)
+
+        # Book, neighbours, neighbour books with their annotations
+        with self.assertNumQueries(3):
+            res = self._related(self.books[0])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["id"] for book in res.data],
+            [self.books[1].id, self.books[2].id]
+        )
+        self.assertGreater(res.data[0]["score"], res.data[1]["score"])
+        self.assertEqual(res.data[0]["inventory"], 5)
+        self.assertEqual(
+            res.data[1]["next_available_date"], date.today().isoformat()
+        )
+        self.assertEqual(self._related(self.books[3]).data, [])
+
+    def test_related_of_unknown_book_is_not_found(self):
+        res = self.client.get(
+            reverse("library_service_api:books-related", args=[999999])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_incremental_build_only_refreshes_changed_books(self):
+        call_command("build_recommendations", stdout=MagicMock())
+        self._reader("d@example.com", [3, 2])
+
+        with patch(
+            "library_service_api.services.recommendation_service"
+            ".neighbors_for",
+            wraps=neighbors_for
+        ) as mock_neighbors:
+            call_command(
+                "build_recommendations", incremental=True, stdout=MagicMock()
+            )
+
+        refreshed = mock_neighbors.call_args.args[1]
+        self.assertEqual(len(refreshed), 2)
+        self.assertEqual(
+            [book["id"] for book in self._related(self.books[3]).data],
+            [self.books[2].id]
+        )
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=24)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=create_user(email="trend@example.com", password="pass1234")
+        )
+        self.old, self.new = (
+            Book.objects.create(
+                title=title,
+                author="Auth",
+                daily_fee=Decimal("1.00"),
+                inventory=5
+            )
+            for title in ("Old Hit", "New Hit")
+        )
+        self.url = reverse("library_service_api:books-trending")
+
+    def _borrow(self, book, at):
+        with patch(
+            "library_service_api.services.trending_service.time.time",
+            return_value=at
+        ), self.captureOnCommitCallbacks(execute=True):
+            count_borrow(MagicMock(book_id=book.id))
+
+    def test_recent_borrows_outweigh_older_ones(self):
+        started = get_epoch()
+        # Two borrows two days ago are worth half a borrow today
+        self._borrow(self.old, started)
+        self._borrow(self.old, started)
+        self._borrow(self.new, started + 2 * 86400)
+        self._borrow(self.new, started + 2 * 86400)
+        self._borrow(self.new, started + 2 * 86400)
+
+        with patch(
+            "library_service_api.services.trending_service.time.time",
+            return_value=started + 2 * 86400
+        ), self.assertNumQueries(2):
+            res = self.client.get(self.url)
+
+        self.assertEqual(
+            [book["title"] for book in res.data], ["New Hit", "Old Hit"]
+        )
+        self.assertEqual(res.data[0]["trending_score"], 3)
+        self.assertEqual(res.data[1]["trending_score"], 0.5)
+
+    def test_renormalize_keeps_decayed_scores(self):
+        started = get_epoch()
+        self._borrow(self.new, started + 86400)
+        with patch(
+            "library_service_api.services.trending_service.time.time",
+            return_value=started + 3 * 86400
+        ):
+            before = self.client.get(self.url).data
+            call_command("update_trending", stdout=MagicMock())
+            self.assertEqual(self.client.get(self.url).data, before)
+
+        self.new.refresh_from_db()
+        self.assertAlmostEqual(self.new.trending_score, 0.25)
+
+    def test_rebuild_from_history(self):
+        for book in (self.old, self.new, self.new):
+            Borrowing.objects.create(
+                expected_return_date=date.today(),
+                book=book,
+                user=create_user(
+                    email=f"r{Borrowing.objects.count()}@example.com",
+                    password="pass1234"
+                )
+            )
+
+        call_command("update_trending", rebuild=True, stdout=MagicMock())
+
+        res = self.client.get(self.url, {"limit": 1})
+        self.assertEqual([book["title"] for book in res.data], ["New Hit"])
+
+
+@patch("library_service_api.views.send_telegram_message")
+@patch("library_service_api.services.payments_service"
+       ".create_checkout_session")
+class BulkReturnTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = create_user(
+            email="librarian@example.com",
+            password="testpass123",
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.books = [
+            Book.objects.create(
+                title=f"Shelf {index}",
+                author="Auth",
+                daily_fee=Decimal("2.00"),
+                inventory=0
+            )
+            for index in range(2)
+        ]
+        self.url = reverse("library_service_api:borrowings-return-bulk")
+
+    def _borrowing(self, book, days_left=3, returned=None):
+        return Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=days_left),
+            actual_return_date=returned,
+            book=book,
+            user=self.staff
+        )
+
+    def test_returns_batch_with_fines_and_one_notification(
+            self, mock_session, mock_telegram
+    ):
+        mock_session.side_effect = [
+            MagicMock(id="cs_bulk_fine", url="http://test.com/s")
+        ]
+        on_time = self._borrowing(self.books[0])
+        late = self._borrowing(self.books[0], days_left=-2)
+        other = self._borrowing(self.books[1])
+        returned = self._borrowing(self.books[1], returned=date.today())
+
+        res = self.client.post(self.url, {
+            "borrowing_ids": [on_time.id, late.id, other.id, returned.id, 0]
+        }, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["returned"], 3)
+        self.assertEqual(
+            [item["status"] for item in res.data["results"]],
+            ["returned", "returned", "returned",
+             "already_returned", "not_found"]
+        )
+        self.assertIsNone(res.data["results"][0]["fine_payment"])
+        self.assertEqual(
+            res.data["results"][1]["fine_payment"]["money_to_pay"], "4.00"
+        )
+        self.assertEqual(
+            [book.inventory for book in Book.objects.order_by("id")], [2, 1]
+        )
+        self.assertEqual(
+            Borrowing.objects.filter(actual_return_date__isnull=True).count(),
+            0
+        )
+        mock_telegram.assert_called_once()
+
+    def test_queries_do_not_grow_with_batch(self, mock_session, _):
+        def queries_for(count):
+            ids = [
+                self._borrowing(self.books[index % 2]).id
+                for index in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(
+                    self.url, {"borrowing_ids": ids}, format="json"
+                )
+            return len(queries)
+
+        # Creates today's rollup rows
+        queries_for(2)
+
+        self.assertEqual(queries_for(2), queries_for(20))
+
+    def test_fine_sessions_open_before_locking(self, mock_session, _):
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def session(**kwargs):
+            depths.append(len(connection.atomic_blocks))
+            return MagicMock(id=f"cs_late_{len(depths)}", url="http://s")
+
+        mock_session.side_effect = session
+        ids = [
+            self._borrowing(self.books[index % 2], days_left=-1).id
+            for index in range(BULK_RETURN_FINE_LIMIT)
+        ]
+
+        res = self.client.post(self.url, {"borrowing_ids": ids},
+                               format="json")
+
+        self.assertEqual(res.data["returned"], BULK_RETURN_FINE_LIMIT)
+        self.assertEqual(depths, [depth] * BULK_RETURN_FINE_LIMIT)
+        self.assertEqual(
+            Payment.objects.filter(type=Payment.TypeChoices.FINE).count(),
+            BULK_RETURN_FINE_LIMIT
+        )
+
+    def test_too_many_late_items_rejected_untouched(self, mock_session, _):
+        late = [
+            self._borrowing(self.books[0], days_left=-1).id
+            for _ in range(BULK_RETURN_FINE_LIMIT + 1)
+        ]
+        on_time = self._borrowing(self.books[1]).id
+
+        res = self.client.post(
+            self.url, {"borrowing_ids": late + [on_time]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["overdue_ids"], late)
+        mock_session.assert_not_called()
+        self.assertEqual(
+            Borrowing.objects.filter(actual_return_date__isnull=True).count(),
+            BULK_RETURN_FINE_LIMIT + 2
+        )
+
+    def test_staff_only(self, *mocks):
+        self.staff.is_staff = False
+        self.staff.save()
+        borrowing = self._borrowing(self.books[0])
+
+        res = self.client.post(
+            self.url, {"borrowing_ids": [borrowing.id]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rejects_bad_payload(self, *mocks):
+        for payload in ({}, {"borrowing_ids": []},
+                        {"borrowing_ids": ["1"]}):
+            res = self.client.post(self.url, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    STRIPE_TIMEOUT=0.5,
+    STRIPE_RETRY_BACKOFF=0,
+    TELEGRAM_BOT_TOKEN=None
+)
+class FakeStripeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe_server = FakeStripeServer()
+        api_base = cls.stripe_server.start()
+        for name, value in (("api_base", api_base), ("api_key", "sk_fake")):
+            patcher = patch.object(stripe, name, value)
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+        cls.addClassCleanup(cls.stripe_server.stop)
+
+    def setUp(self):
+        cache.clear()
+        self.stripe_server.reset()
+        self.stripe_server.latency = 0
+        self.stripe_server.error_rate = 0
+        self.stripe_server.paid_rate = 1
+        self.client = APIClient()
+        self.user = create_user(email="load@example.com", password="pass1234")
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Load Test",
+            author="Auth",
+            daily_fee=Decimal("1.50"),
+            inventory=10
+        )
+
+    def _borrow(self):
+        return self.client.post(BORROWINGS_URL, {
+            "book_id": self.book.id,
+            "expected_return_date": (
+                    date.today() + timedelta(days=2)
+            ).isoformat()
+        }, format="json")
+
+    def test_borrow_and_pay_against_fake(self):
+        self.assertEqual(self._borrow().status_code, status.HTTP_201_CREATED)
+        payment = Payment.objects.get()
+        self.assertIn(payment.session_id, self.stripe_server.sessions)
+        self.assertEqual(
+            self.stripe_server.sessions[payment.session_id]["amount_total"],
+            300
+        )
+
+        res = self.client.get(
+            reverse("library_service_api:payments-success"),
+            {"session_id": payment.session_id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PAID)
+        listed = stripe.checkout.Session.list(limit=1)
+        self.assertEqual(listed.data[0].id, payment.session_id)
+
+    def test_unpaid_outcome_keeps_payment_pending(self):
+        self.stripe_server.paid_rate = 0
+        self._borrow()
+        payment = Payment.objects.get()
+
+        self.client.get(
+            reverse("library_service_api:payments-success"),
+            {"session_id": payment.session_id}
+        )
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+
+    def test_injected_errors_open_breaker(self):
+        self.stripe_server.error_rate = 1
+        self.assertEqual(
+            self._borrow().status_code,
+            status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self._borrow()
+
+        self.stripe_server.error_rate = 0
+        # Open breaker: fails fast without reaching the fake
+        self.assertEqual(
+            self._borrow().status_code,
+            status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(self.stripe_server.sessions, {})
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 10)
+
+    @override_settings(STRIPE_TIMEOUT=0.1, STRIPE_TIMEOUT_BUDGET=0.5)
+    def test_latency_above_timeout_stays_within_budget(self):
+        self.stripe_server.latency = 0.5
+        started = time.monotonic()
+
+        res = self._borrow()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+@patch("library_service_api.views.send_telegram_message")
+@patch("library_service_api.serializers.send_telegram_message")
+@patch("library_service_api.services.payments_service"
+       ".create_checkout_session")
+class WritePathQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="lean@example.com", password="pass1234")
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Lean Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=2
+        )
+
+    def _borrowing(self, days_left):
+        return Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=days_left),
+            book=self.book,
+            user=self.user
+        )
+
+    def _return_url(self, borrowing):
+        return reverse(
+            "library_service_api:borrowings-return", args=[borrowing.id]
+        )
+
+    def _borrow(self):
+        return self.client.post(BORROWINGS_URL, {
+            "book_id": self.book.id,
+            "expected_return_date": (
+                    date.today() + timedelta(days=2)
+            ).isoformat()
+        }, format="json")
+
+    def _locked_then_after_commit(self, locked, after_commit, request):
+        """Pin the statements inside the transaction and after it apart"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(locked):
+                res = request()
+        with self.assertNumQueries(after_commit):
+            for callback in callbacks:
+                callback()
+        return res
+
+    def test_borrow_statement_count(self, mock_session, *mocks):
+        mock_session.side_effect = [
+            MagicMock(id="cs_first", url="http://s"),
+            MagicMock(id="cs_lean", url="http://s"),
+        ]
+        # Creates today's rollup rows
+        with self.captureOnCommitCallbacks(execute=True):
+            self._borrow()
+
+        # Locked: book lookup, savepoint, conditional stock UPDATE,
+        # borrowing and payment INSERTs, release. After the commit: the
+        # payment total, circulation and trending score, one each
+        res = self._locked_then_after_commit(6, 3, self._borrow)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_return_statement_count(self, mock_session, *mocks):
+        mock_session.side_effect = [
+            MagicMock(id="cs_warm", url="http://s"),
+            MagicMock(id="cs_fine", url="http://s"),
+        ]
+        warm, on_time, late = (
+            self._borrowing(-1), self._borrowing(2), self._borrowing(-1)
+        )
+        # Creates today's rollup rows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self._return_url(warm))
+
+        # Locked: borrowing with book and user, savepoint, conditional
+        # borrowing UPDATE, stock UPDATE, release. After: circulation
+        res = self._locked_then_after_commit(
+            5, 1, lambda: self.client.post(self._return_url(on_time))
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # ... plus the fine payment INSERT, and its payment total after
+        res = self._locked_then_after_commit(
+            6, 2, lambda: self.client.post(self._return_url(late))
+        )
+        self.assertIn("fine_payment", res.data)
+
+    def test_concurrent_return_puts_copy_back_once(self, *mocks):
+        borrowing = self._borrowing(2)
+        stale = Borrowing.objects.select_related("book", "user").get(
+            pk=borrowing.pk
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            actual_return_date=date.today()
+        )
+
+        with patch(
+            "library_service_api.views.BorrowingViewSet.get_object",
+            return_value=stale
+        ):
+            res = self.client.post(self._return_url(borrowing))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite deployment mode")
+class SQLiteModeTests(TestCase):
+    def test_connection_is_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreater(cursor.fetchone()[0], 0)
+        self.assertEqual(
+            connection.settings_dict["OPTIONS"]["transaction_mode"],
+            "IMMEDIATE"
+        )
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=create_user(email="typer@example.com", password="pass1234")
+        )
+        for title, author in (
+                ("Les Misérables", "Victor Hugo"),
+                ("Harry Potter", "J. K. Rowling"),
+                ("Hamlet", "William Shakespeare"),
+        ):
+            Book.objects.create(
+                title=title,
+                author=author,
+                daily_fee=Decimal("1.00"),
+                inventory=1
+            )
+        self.url = reverse("library_service_api:books-suggest")
+
+    def _titles(self, prefix, **params):
+        res = self.client.get(self.url, {"prefix": prefix, **params})
+        return [book["title"] for book in res.data]
+
+    def test_prefix_matches_titles_and_authors(self):
+        self.assertEqual(self._titles("ha"), ["Hamlet", "Harry Potter"])
+        self.assertEqual(self._titles("  LES  MISE"), ["Les Misérables"])
+        self.assertEqual(self._titles("will"), ["Hamlet"])
+        self.assertEqual(self._titles("ha", limit=1), ["Hamlet"])
+        self.assertEqual(self._titles("zz"), [])
+
+    def test_warm_index_does_not_query_database(self):
+        self._titles("h")
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self._titles("h")), 2)
+
+    def test_index_follows_book_changes(self):
+        self._titles("h")
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.get(title="Hamlet")
+            book.title = "Macbeth"
+            book.save()
+        self.assertEqual(self._titles("mac"), ["Macbeth"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(self._titles("mac"), [])
+
+    def test_stock_changes_keep_index(self):
+        self._titles("h")
+        with self.captureOnCommitCallbacks(execute=True):
+            set_shards(Book.objects.get(title="Hamlet"), 2)
+        with self.assertNumQueries(0):
+            self._titles("h")
+
+    def test_edits_of_other_fields_keep_index(self):
+        self._titles("h")
+        staff = create_user(
+            email="editor@example.com", password="pass1234", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+        book = Book.objects.get(title="Hamlet")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("library_service_api:books-detail", args=[book.id]),
+                {"daily_fee": "2.00"},
+                format="json"
+            )
+            book.refresh_from_db()
+            book.save()
+        with self.assertNumQueries(0):
+            self._titles("h")
+
+    def test_stale_index_served_while_another_thread_rebuilds(self):
+        self._titles("h")
+        stale = suggest_service.get_index()
+        suggest_service._index_lock.acquire()
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                Book.objects.filter(title="Hamlet").first().delete()
+            with self.assertNumQueries(0):
+                self.assertIs(suggest_service.get_index(), stale)
+        finally:
+            suggest_service._index_lock.release()
+
+        self.assertEqual(self._titles("ham"), [])
+
+    def test_prefix_required(self):
+        res = self.client.get(self.url, {"prefix": " "})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    SLOW_QUERY_THRESHOLD_MS=1e-9,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0
+)
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        patcher = patch("library_service_api.slow_queries.logger")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=create_user(email="slow@example.com", password="pass1234")
+        )
+        Book.objects.create(
+            title="Slow Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=1
+        )
+
+    def _book_list_query(self):
+        return SlowQuery.objects.get(
+            sql__startswith='SELECT "library_service_api_book"."id"'
+        )
+
+    def test_fingerprint_ignores_literals_and_in_lists(self):
+        short, _ = fingerprint(
+            "SELECT * FROM book WHERE id IN (%s, %s) AND title = 'a' LIMIT 1"
+        )
+        long, normalized = fingerprint(
+            "SELECT  * FROM book WHERE id IN (%s, %s, %s) "
+            "AND title = 'b''c' LIMIT 20"
+        )
+        self.assertEqual(short, long)
+        self.assertEqual(
+            normalized,
+            "SELECT * FROM book WHERE id IN (...) AND title = ? LIMIT ?"
+        )
+
+    def test_slow_statements_aggregated_with_view_and_plan(self):
+        self.client.get(BOOKS_URL)
+        self.client.get(BOOKS_URL)
+
+        query = self._book_list_query()
+        self.assertEqual(query.calls, 2)
+        self.assertEqual(query.view, "library_service_api:books-list")
+        self.assertGreaterEqual(query.total_ms, query.max_ms)
+        self.assertTrue(query.plan)
+
+        out = StringIO()
+        call_command("slow_queries", limit=50, plans=True, stdout=out)
+        self.assertIn("books-list", out.getvalue())
+
+    @override_settings(SLOW_QUERY_MAX_ENTRIES=2)
+    def test_table_is_bounded(self):
+        self.client.get(BOOKS_URL)
+        self.client.get(BORROWINGS_URL)
+        self.assertEqual(SlowQuery.objects.count(), 2)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_disabled_by_default(self):
+        self.client.get(BOOKS_URL)
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class FineAccrualTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="accrue@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Accrual Book",
+            author="Auth",
+            daily_fee=Decimal("1.50"),
+            inventory=5
+        )
+        self.late = self._borrowing(-3)
+        self.on_time = self._borrowing(2)
+        self.returned = self._borrowing(-10)
+        Borrowing.objects.filter(pk=self.returned.pk).update(
+            actual_return_date=date.today()
+        )
+
+    def _borrowing(self, days_left):
+        return Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=days_left),
+            book=self.book,
+            user=self.user
+        )
+
+    def _by_id(self, res):
+        return {item["id"]: item for item in res.data["results"]}
+
+    def test_annotation_matches_fine_formula(self):
+        borrowings = {
+            borrowing.pk: borrowing
+            for borrowing in Borrowing.objects.with_accrual()
+        }
+
+        self.assertEqual(borrowings[self.late.pk].days_overdue, 3)
+        self.assertEqual(
+            borrowings[self.late.pk].accrued_fine, Decimal("4.50")
+        )
+        for pk in [self.on_time.pk, self.returned.pk]:
+            self.assertEqual(borrowings[pk].days_overdue, 0)
+            self.assertEqual(borrowings[pk].accrued_fine, Decimal("0"))
+
+    def test_list_reports_accrual(self):
+        res = self.client.get(BORROWINGS_URL)
+
+        items = self._by_id(res)
+        self.assertEqual(items[self.late.pk]["days_overdue"], 3)
+        self.assertEqual(items[self.late.pk]["accrued_fine"], "4.50")
+        self.assertEqual(items[self.on_time.pk]["accrued_fine"], "0.00")
+        self.assertEqual(items[self.returned.pk]["days_overdue"], 0)
+
+    def test_overdue_filter(self):
+        res = self.client.get(BORROWINGS_URL, {"overdue": "true"})
+        self.assertEqual(set(self._by_id(res)), {self.late.pk})
+
+        res = self.client.get(BORROWINGS_URL, {"overdue": "false"})
+        self.assertEqual(
+            set(self._by_id(res)), {self.on_time.pk, self.returned.pk}
+        )
+
+    def test_accrual_adds_no_queries(self):
+        for _ in range(5):
+            self._borrowing(-1)
+
+        # Count and one page of borrowings with their books, however
+        # many of them are overdue
+        with self.assertNumQueries(2):
+            res = self.client.get(BORROWINGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @patch("library_service_api.views.send_telegram_message")
+    @patch("library_service_api.services.payments_service"
+           ".create_checkout_session")
+    def test_returned_borrowing_stops_accruing(self, mock_session, *mocks):
+        mock_session.return_value = MagicMock(id="cs_accrual", url="http://s")
+        url = reverse(
+            "library_service_api:borrowings-return", args=[self.late.id]
+        )
+        res = self.client.post(url)
+
+        self.assertEqual(res.data["days_overdue"], 0)
+        self.assertEqual(res.data["accrued_fine"], "0.00")
+
+
+class FilteringTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="filter@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Filter Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=5
+        )
+        self.other_book = Book.objects.create(
+            title="Other Book",
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=5
+        )
+        self.old = self._borrowing(self.book, -40, 10)
+        self.recent = self._borrowing(self.other_book, -2, 5)
+        self.payment = Payment.objects.create(
+            status=Payment.StatusChoices.PAID,
+            type=Payment.TypeChoices.FINE,
+            borrowing=self.old,
+            session_url="http://s",
+            session_id="cs_filter_paid",
+            money_to_pay=Decimal("3.00")
+        )
+        self.pending = Payment.objects.create(
+            borrowing=self.recent,
+            session_url="http://s",
+            session_id="cs_filter_pending",
+            money_to_pay=Decimal("5.00")
+        )
+
+    def _borrowing(self, book, borrowed_days_ago, loan_days):
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(
+                days=borrowed_days_ago + loan_days
+            ),
+            book=book,
+            user=self.user
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=date.today() + timedelta(days=borrowed_days_ago)
+        )
+        return borrowing
+
+    def _ids(self, url, params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {item["id"] for item in res.data["results"]}
+
+    def test_borrowing_filters(self):
+        week_ago = (date.today() - timedelta(days=7)).isoformat()
+
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {"borrow_date_after": week_ago}),
+            {self.recent.id}
+        )
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {"borrow_date_before": week_ago}),
+            {self.old.id}
+        )
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {"book": self.book.id}), {self.old.id}
+        )
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {"overdue": "true"}), {self.old.id}
+        )
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {
+                "expected_return_date_after": date.today().isoformat(),
+                "is_active": "true",
+            }),
+            {self.recent.id}
+        )
+
+    def test_user_id_is_ignored_for_customers(self):
+        other = create_user(email="other-filter@example.com", password="pass")
+
+        self.assertEqual(
+            self._ids(BORROWINGS_URL, {"user_id": other.id}),
+            {self.old.id, self.recent.id}
+        )
+
+    def test_invalid_filter_value_is_rejected(self):
+        res = self.client.get(BORROWINGS_URL, {"borrow_date_after": "soon"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_payment_filters(self):
+        self.assertEqual(
+            self._ids(PAYMENTS_URL, {"status": "PAID", "type": "FINE"}),
+            {self.payment.id}
+        )
+        self.assertEqual(
+            self._ids(PAYMENTS_URL, {"borrowing": self.recent.id}),
+            {self.pending.id}
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "plans checked on SQLite")
+class FilterIndexTests(TestCase):
+    """Every supported filter combination is answered from an index"""
+
+    def _plan(self, filterset_class, params, **restriction):
+        queryset = filterset_class.Meta.model.objects.filter(**restriction)
+        # A page, as the list endpoint asks for it
+        return filterset_class(params, queryset=queryset).qs[:10].explain()
+
+    def _assert_indexed(self, plan, table, index=None):
+        # No full table scan; an ordered walk of an index is fine for
+        # a page
+        self.assertNotRegex(plan, rf"SCAN {table}(?! USING)")
+        if index:
+            self.assertIn(f"USING INDEX {index}", plan)
+
+    def test_borrowing_filters_use_indexes(self):
+        table = Borrowing._meta.db_table
+        cases = [
+            ({}, {"user_id": 1}, "borrowing_user_borrow_idx"),
+            ({"borrow_date_after": "2025-01-01"}, {"user_id": 1},
+             "borrowing_user_borrow_idx"),
+            ({"is_active": "true"}, {"user_id": 1},
+             "borrowing_user_borrow_idx"),
+            ({"book": 1, "borrow_date_after": "2025-01-01"}, {},
+             "borrowing_book_borrow_idx"),
+            ({"overdue": "true"}, {}, "borrowing_active_due_idx"),
+            ({"is_active": "false"}, {}, None),
+            ({"borrow_date_after": "2025-01-01"}, {}, None),
+            ({"expected_return_date_before": "2025-01-01"}, {}, None),
+            ({"actual_return_date_after": "2025-01-01",
+              "actual_return_date_before": "2025-02-01"}, {},
+             "borrowing_returned_idx"),
+        ]
+        for params, restriction, index in cases:
+            with self.subTest(params=params, restriction=restriction):
+                plan = self._plan(BorrowingFilter, params, **restriction)
+                self._assert_indexed(plan, table, index)
+
+    def test_payment_filters_use_indexes(self):
+        table = Payment._meta.db_table
+        cases = [
+            ({"status": "PAID"}, "payment_status_type_idx"),
+            ({"status": "PAID", "type": "FINE"}, "payment_status_type_idx"),
+            ({"type": "FINE"}, None),
+            ({"borrowing": 1}, None),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                plan = self._plan(PaymentFilter, params)
+                self._assert_indexed(plan, table, index)
+
+
+class NextAvailableDateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="next@example.com", password="pass1234")
+        self.client.force_authenticate(user=self.user)
+        self.out = self._book("Out of stock", 0)
+        self.in_stock = self._book("In stock", 3)
+        self.lost = self._book("All copies lost", 0)
+        for days in [7, 3]:
+            self._borrowing(self.out, days)
+        self._borrowing(self.in_stock, 1)
+        returned = self._borrowing(self.out, 1)
+        Borrowing.objects.filter(pk=returned.pk).update(
+            actual_return_date=date.today()
+        )
+
+    def _book(self, title, inventory):
+        return Book.objects.create(
+            title=title,
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=inventory
+        )
+
+    def _borrowing(self, book, days_left):
+        return Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=days_left),
+            book=book,
+            user=self.user
+        )
+
+    def _listed(self):
+        res = self.client.get(BOOKS_URL)
+        return {
+            item["id"]: item["next_available_date"]
+            for item in res.data["results"]
+        }
+
+    def test_earliest_active_return_for_out_of_stock_books(self):
+        listed = self._listed()
+
+        self.assertEqual(
+            listed[self.out.id],
+            (date.today() + timedelta(days=3)).isoformat()
+        )
+        self.assertIsNone(listed[self.in_stock.id])
+        self.assertIsNone(listed[self.lost.id])
+
+    def test_overdue_copy_is_expected_today(self):
+        self._borrowing(self.out, -2)
+
+        self.assertEqual(self._listed()[self.out.id], date.today().isoformat())
+
+    def test_list_queries_do_not_grow_with_out_of_stock_books(self):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(BOOKS_URL)
+        for number in range(5):
+            self._borrowing(self._book(f"Gone {number}", 0), 2)
+
+        with self.assertNumQueries(len(before)):
+            self.client.get(BOOKS_URL)
+
+    @skipUnless(connection.vendor == "sqlite", "plans checked on SQLite")
+    def test_subquery_uses_active_due_index(self):
+        plan = Book.objects.with_available_inventory(
+        ).with_next_available_date().explain()
+
+        self.assertIn("borrowing_book_active_due_idx", plan)
+
+    def test_restock_response_reports_the_new_state(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.patch(
+            reverse("library_service_api:books-detail", args=[self.out.id]),
+            {"inventory": 3},
+            format="json"
+        )
+
+        self.assertEqual(res.data["inventory"], 3)
+        self.assertIsNone(res.data["next_available_date"])
+
+    def test_serializer_falls_back_without_annotation(self):
+        data = BookSerializer(Book.objects.get(pk=self.out.pk)).data
+
+        self.assertEqual(
+            data["next_available_date"],
+            (date.today() + timedelta(days=3)).isoformat()
+        )
+
+
+class InventoryConsistencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "stock@example.com", "adminpass123"
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.book = self._book("Counted", 5)
+        self.sharded = set_shards(self._book("Sharded", 6), shards=3)
+        for book in [self.book, self.sharded]:
+            Borrowing.objects.create(
+                expected_return_date=date.today() + timedelta(days=3),
+                book=book,
+                user=self.admin
+            )
+            take_copy(book)
+
+    def _book(self, title, inventory):
+        return Book.objects.create(
+            title=title,
+            author="Auth",
+            daily_fee=Decimal("1.00"),
+            inventory=inventory
+        )
+
+    def _check(self, *args):
+        out = StringIO()
+        call_command("check_inventory", *args, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def test_new_book_counts_its_inventory(self):
+        res = self.client.post(BOOKS_URL, {
+            "title": "Fresh",
+            "author": "Auth",
+            "daily_fee": "1.00",
+            "inventory": 4,
+            "total_copies": 100,
+        }, format="json")
+
+        self.assertEqual(res.data["total_copies"], 4)
+
+    def test_inventory_edits_move_the_total(self):
+        url = reverse("library_service_api:books-detail", args=[self.book.id])
+        res = self.client.patch(url, {"inventory": 7}, format="json")
+
+        self.assertEqual(res.data["total_copies"], 8)
+        set_inventory(self.sharded, 2)
+        self.sharded.refresh_from_db()
+        self.assertEqual(self.sharded.total_copies, 3)
+        self.assertIn("Inventory is consistent", self._check())
+
+    @staticmethod
+    def _set_then_borrow(book, total):
+        # A borrow landing right after the stock edit
+        set_inventory(book, total)
+        Book.objects.filter(pk=book.pk).update(
+            inventory=F("inventory") - 1,
+            trending_score=F("trending_score") + 1
+        )
+
+    def test_edit_keeps_concurrent_counter_moves(self):
+        url = reverse("library_service_api:books-detail", args=[self.book.id])
+        with patch("library_service_api.serializers.set_inventory",
+                   side_effect=self._set_then_borrow):
+            self.client.patch(
+                url, {"inventory": 7, "title": "Renamed"}, format="json"
+            )
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Renamed")
+        self.assertEqual(self.book.inventory, 6)
+        self.assertEqual(self.book.total_copies, 8)
+        self.assertEqual(self.book.trending_score, 1)
+
+    def test_admin_edit_moves_the_total_only(self):
+        self.client.force_login(self.admin)
+        url = reverse(
+            "admin:library_service_api_book_change", args=[self.book.id]
+        )
+        form = {
+            "title": "Counted",
+            "author": "Auth",
+            "daily_fee": "1.00",
+            "inventory": 7,
+            "cover": self.book.cover,
+            "inventory_shards": 0,
+            "trending_score": 0,
+        }
+
+        with patch("library_service_api.admin.set_inventory",
+                   side_effect=self._set_then_borrow):
+            res = self.client.post(url, form)
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 6)
+        self.assertEqual(self.book.total_copies, 8)
+        self.assertEqual(self.book.trending_score, 1)
+
+    def test_check_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(find_drift()), [])
+
+    def test_reports_and_repairs_drift(self):
+        Book.objects.filter(pk=self.book.pk).update(inventory=9)
+        BookInventorySlot.objects.filter(book=self.sharded).update(count=0)
+
+        with self.assertRaises(CommandError):
+            self._check()
+        out = self._check("--repair", "--batch-size", "1")
+
+        self.assertIn("Repaired 2 books", out)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+        self.assertEqual(available_inventory(self.sharded), 5)
+        self.assertIn("Inventory is consistent", self._check())
+
+    def test_total_below_loans_is_not_repaired(self):
+        Book.objects.filter(pk=self.book.pk).update(total_copies=0)
+
+        out = self._check("--repair")
+
+        self.assertIn("fewer total copies than copies on loan", out)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+
+
+class FixtureInventoryTests(TestCase):
+    def test_fixture_loads_consistent(self):
+        call_command("loaddata", settings.BASE_DIR / "fixture.json",
+                     verbosity=0)
+
+        self.assertEqual(list(find_drift()), [])
+        self.assertEqual(Book.objects.get(pk=2).total_copies, 198)
+
+    def test_raw_load_without_totals_counts_inventory(self):
+        data = json.dumps([{
+            "model": "library_service_api.book",
+            "pk": 50,
+            "fields": {
+                "title": "Loaded",
+                "author": "Auth",
+                "daily_fee": "1.00",
+                "inventory": 6,
+                "cover": "SOFT",
+            },
+        }])
+        for obj in deserialize("json", data):
+            obj.save()
+
+        self.assertEqual(Book.objects.get(pk=50).total_copies, 6)
+
+    def test_bulk_create_counts_inventory(self):
+        Book.objects.bulk_create([
+            Book(title="Bulk", author="Auth", daily_fee=Decimal("1.00"),
+                 inventory=3)
+        ])
+
+        self.assertEqual(Book.objects.get(title="Bulk").total_copies, 3)
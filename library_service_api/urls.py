@@ -3,7 +3,8 @@ from rest_framework import routers
 
 from library_service_api.views import (BookViewSet,
                                        BorrowingViewSet,
-                                       PaymentViewSet)
+                                       PaymentViewSet,
+                                       ReportViewSet)
 
 app_name = "library_service_api"
 
@@ -11,5 +12,6 @@ router = routers.DefaultRouter()
 router.register(r'books', BookViewSet, basename="books")
 router.register(r'borrowings', BorrowingViewSet, basename='borrowings')
 router.register(r'payments', PaymentViewSet, basename="payments")
+router.register(r'reports', ReportViewSet, basename="reports")
 
 urlpatterns = [path("", include(router.urls))]
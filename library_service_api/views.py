@@ -1,63 +1,216 @@
-import stripe
+from collections import Counter
+
 from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.utils.dateparse import parse_date
 from django.utils.timezone import now
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import (IsAdminUser,
+                                        IsAuthenticated,
+                                        SAFE_METHODS)
 from rest_framework.response import Response
 
-from library_service_api.models import Book, Borrowing, Payment
+from library_service_api.filters import (ArchivedBorrowingFilter,
+                                         ArchivedPaymentFilter,
+                                         BorrowingFilter,
+                                         PaymentFilter)
+from library_service_api.idempotency import idempotent
+from library_service_api.mixins import DynamicQuerysetMixin
+from library_service_api.models import (ArchivedBorrowing,
+                                        ArchivedPayment,
+                                        Book,
+                                        BookNeighbor,
+                                        Borrowing,
+                                        DailyBookCirculation,
+                                        DailyPaymentTotal,
+                                        Payment)
+from library_service_api.pagination import EstimatedCountPageNumberPagination
 from library_service_api.permissions import IsAdminOrIfAuthenticatedReadOnly
-from library_service_api.serializers import (BookSerializer,
+from library_service_api.serializers import (ArchivedBorrowingSerializer,
+                                             ArchivedPaymentSerializer,
+                                             BookSerializer,
                                              BorrowingSerializer,
-                                             PaymentSerializer)
-from library_service_api.services.payments_service import create_fine_payment
+                                             PaymentSerializer,
+                                             ReportSummarySerializer)
+from library_service_api.services.inventory_service import put_copy
+from library_service_api.services.payments_service import (
+    calculate_fine,
+    create_fine_payment,
+    open_fine_payments,
+    save_payments
+)
+from library_service_api.services.reporting_service import (
+    record_payment_status_change,
+    record_returns
+)
+from library_service_api.services.stripe_client import (
+    PaymentServiceUnavailable,
+    retrieve_checkout_session
+)
+from library_service_api.services.suggest_service import get_index
 from library_service_api.services.telegram_service import send_telegram_message
+from library_service_api.services.trending_service import (
+    current_scale,
+    get_epoch
+)
+
+# Upper bound on borrowings closed by one bulk return request
+BULK_RETURN_LIMIT = 200
+# Upper bound on overdue borrowings in it: each one is a Stripe call
+# of up to STRIPE_TIMEOUT_BUDGET seconds, and they all have to finish
+# well inside the worker timeout
+BULK_RETURN_FINE_LIMIT = 20
+
 
+def reads_archive(request):
+    """History requests opt in to archived rows with ?archived=true"""
+    archived = request.query_params.get("archived", "")
+    return request.method in SAFE_METHODS and archived.lower() in ["true", "1"]
 
-class BookViewSet(viewsets.ModelViewSet):
+
+class BookViewSet(DynamicQuerysetMixin, viewsets.ModelViewSet):
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
-    pagination_class = PageNumberPagination
-    queryset = Book.objects.all()
+    pagination_class = EstimatedCountPageNumberPagination
+    queryset = Book.objects.with_available_inventory()
     serializer_class = BookSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Reads only: an update response would show the value from
+        # before the edit. Per request, the date is part of it.
+        if self.action in ["list", "retrieve", "trending"]:
+            queryset = queryset.with_next_available_date()
+        return queryset
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=False,
+        methods=["get"],
+        url_name="suggest",
+        url_path="suggest"
+    )
+    def suggest(self, request):
+        """As-you-type title and author suggestions, from memory"""
+        prefix = request.query_params.get("prefix", "")
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 20)
+        except ValueError:
+            return Response(
+                {"detail": "limit must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not prefix.strip():
+            return Response(
+                {"detail": "prefix is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(get_index().search(prefix, max(limit, 0)))
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_name="trending",
+        url_path="trending"
+    )
+    def trending(self, request):
+        """Most borrowed books lately, newest borrows weighing most"""
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            return Response(
+                {"detail": "limit must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        books = self.get_queryset().filter(
+            trending_score__gt=0
+        ).order_by("-trending_score")[:max(limit, 0)]
+        scale = current_scale(get_epoch())
+        return Response([
+            {
+                **self.get_serializer(book).data,
+                "trending_score": round(book.trending_score * scale, 3),
+            }
+            for book in books
+        ])
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_name="related",
+        url_path="related"
+    )
+    def related(self, request, pk=None):
+        """Books most often borrowed by readers of this one"""
+        book = self.get_object()
+        # Neighbours carry the same annotations as list pages, so
+        # sharded or out-of-stock ones cost no extra query
+        neighbors = list(
+            BookNeighbor.objects.filter(book=book)
+            .order_by("rank")
+            .prefetch_related(Prefetch(
+                "neighbor",
+                queryset=Book.objects.with_available_inventory()
+                .with_next_available_date()
+            ))
+        )
+        books = BookSerializer(
+            [neighbor.neighbor for neighbor in neighbors], many=True
+        ).data
+        return Response([
+            {**data, "score": neighbor.score}
+            for data, neighbor in zip(books, neighbors)
+        ])
+
+
+class BorrowingViewSet(DynamicQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
     queryset = Borrowing.objects.all()
-    pagination_class = PageNumberPagination
-    filterset_fields = ["user", "actual_return_date"]
+    pagination_class = EstimatedCountPageNumberPagination
+
+    @property
+    def filterset_class(self):
+        if reads_archive(self.request):
+            return ArchivedBorrowingFilter
+        return BorrowingFilter
+
+    def get_serializer_class(self):
+        if reads_archive(self.request):
+            return ArchivedBorrowingSerializer
+        return BorrowingSerializer
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Borrowing.objects.all()
+        if reads_archive(self.request):
+            queryset = ArchivedBorrowing.objects.all()
+        elif self.action in ["list", "retrieve"]:
+            queryset = Borrowing.objects.with_accrual()
+        else:
+            queryset = Borrowing.objects.all()
 
         # Non-admin users see only their own borrowings
         if not user.is_staff:
             queryset = queryset.filter(user=user)
 
-        # Filtering by query params
-        user_id = self.request.query_params.get("user_id")
-        if user_id and user.is_staff:
-            queryset = queryset.filter(user_id=user_id)
-
-        is_active = self.request.query_params.get("is_active")
-        if is_active is not None:
-            if is_active.lower() in ["true", "1"]:
-                queryset = queryset.filter(actual_return_date__isnull=True)
-            elif is_active.lower() in ["false", "0"]:
-                queryset = queryset.filter(actual_return_date__isnull=False)
+        if self.action == "return_borrowing":
+            # The fine, notification and response all need both
+            queryset = queryset.select_related("book", "user")
 
         return queryset
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     @action(
         detail=True,
         methods=["post"],
         url_name="return",
         url_path="return"
     )
+    @idempotent
     def return_borrowing(self, request, pk=None):
         borrowing = self.get_object()
 
@@ -67,13 +220,29 @@ class BorrowingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # The fine session is created inside the transaction, so a Stripe
+        # outage rolls the return back instead of losing the fine
         with transaction.atomic():
-            book = Book.objects.select_for_update().get(id=borrowing.book.id)
-            book.inventory += 1
-            book.save(update_fields=["inventory"])
-
             borrowing.actual_return_date = now().date()
-            borrowing.save(update_fields=["actual_return_date"])
+            # Conditional, so a concurrent return of the same borrowing
+            # cannot put the copy back twice
+            returned = Borrowing.objects.filter(
+                pk=borrowing.pk,
+                actual_return_date__isnull=True
+            ).update(actual_return_date=borrowing.actual_return_date)
+            if not returned:
+                return Response(
+                    {"detail": "This borrowing has already been returned."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            put_copy(borrowing.book)
+
+            fine_payment = None
+            if borrowing.actual_return_date > borrowing.expected_return_date:
+                fine_payment = create_fine_payment(
+                    request, borrowing, calculate_fine(borrowing)
+                )
+            record_returns([borrowing])
 
         send_telegram_message(
             f"✅ Borrowing returned!\n\n"
@@ -82,15 +251,6 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             f"Returned at: {borrowing.actual_return_date}"
         )
 
-        fine_payment = None
-        if borrowing.actual_return_date > borrowing.expected_return_date:
-            days_late = (
-                    borrowing.actual_return_date
-                    - borrowing.expected_return_date
-            ).days
-            fine_amount = days_late * borrowing.book.daily_fee
-            fine_payment = create_fine_payment(request, borrowing, fine_amount)
-
         response_data = BorrowingSerializer(borrowing).data
         if fine_payment:
             response_data["fine_payment"] = PaymentSerializer(
@@ -99,16 +259,164 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
         return Response(response_data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_name="return-bulk",
+        url_path="return-bulk",
+        permission_classes=[IsAdminUser]
+    )
+    @idempotent
+    def return_bulk(self, request):
+        """
+        Check in many borrowings at once (librarian scanning a pile).
+
+        Fine sessions are opened on Stripe first, with nothing locked;
+        then one transaction closes the borrowings with one UPDATE, puts
+        stock back with one F() increment per title and saves the fines,
+        and there is one Telegram message for the whole batch. Borrowings
+        that do not exist or are already returned are reported, not
+        treated as errors. A batch with more than BULK_RETURN_FINE_LIMIT
+        overdue borrowings is rejected before any work is done.
+        """
+        ids = request.data.get("borrowing_ids")
+        if (
+                not isinstance(ids, list)
+                or not 0 < len(ids) <= BULK_RETURN_LIMIT
+                or not all(
+                    isinstance(borrowing_id, int)
+                    and not isinstance(borrowing_id, bool)
+                    for borrowing_id in ids
+                )
+        ):
+            return Response(
+                {"detail": f"borrowing_ids must be a list of 1 to "
+                           f"{BULK_RETURN_LIMIT} ids."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = list(dict.fromkeys(ids))
+
+        today = now().date()
+        late = list(
+            Borrowing.objects.select_related("book", "user").filter(
+                id__in=ids,
+                actual_return_date__isnull=True,
+                expected_return_date__lt=today
+            )
+        )
+        if len(late) > BULK_RETURN_FINE_LIMIT:
+            return Response(
+                {"detail": f"At most {BULK_RETURN_FINE_LIMIT} of the "
+                           f"borrowings may be overdue, return the rest "
+                           f"in another request.",
+                 "overdue_ids": sorted(borrowing.id for borrowing in late)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        for borrowing in late:
+            borrowing.actual_return_date = today
+        # A borrowing returned concurrently before the lock below only
+        # leaves its unused session behind
+        fines = {
+            payment.borrowing_id: payment
+            for payment in open_fine_payments(request, [
+                (borrowing, calculate_fine(borrowing)) for borrowing in late
+            ])
+        }
+
+        with transaction.atomic():
+            borrowings = {
+                borrowing.id: borrowing
+                for borrowing in Borrowing.objects.select_for_update(
+                    of=("self",)
+                ).select_related("book", "user").filter(id__in=ids)
+            }
+            returning = [
+                borrowing for borrowing in borrowings.values()
+                if borrowing.actual_return_date is None
+            ]
+            Borrowing.objects.filter(
+                id__in=[borrowing.id for borrowing in returning]
+            ).update(actual_return_date=today)
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+            copies = Counter(borrowing.book_id for borrowing in returning)
+            books = {borrowing.book_id: borrowing.book
+                     for borrowing in returning}
+            # Fixed order, so concurrent batches cannot deadlock
+            for book_id in sorted(copies):
+                put_copy(books[book_id], copies[book_id])
+
+            for borrowing in returning:
+                borrowing.actual_return_date = today
+
+            fine_payments = {
+                payment.borrowing_id: payment
+                for payment in save_payments([
+                    fines[borrowing.id] for borrowing in returning
+                    if borrowing.id in fines
+                ])
+            }
+            record_returns(returning)
+
+        if returning:
+            send_telegram_message(
+                f"✅ {len(returning)} borrowings returned!\n\n"
+                + "\n".join(
+                    f"{borrowing.user} — {borrowing.book}"
+                    for borrowing in returning
+                )
+                + f"\n\nReturned at: {today}"
+            )
+
+        returned_ids = {borrowing.id for borrowing in returning}
+        results = []
+        for borrowing_id in ids:
+            if borrowing_id not in borrowings:
+                results.append({"id": borrowing_id, "status": "not_found"})
+            elif borrowing_id not in returned_ids:
+                results.append(
+                    {"id": borrowing_id, "status": "already_returned"}
+                )
+            else:
+                fine_payment = fine_payments.get(borrowing_id)
+                results.append({
+                    "id": borrowing_id,
+                    "status": "returned",
+                    "actual_return_date": today,
+                    "fine_payment": (
+                        PaymentSerializer(fine_payment).data
+                        if fine_payment else None
+                    ),
+                })
+
+        return Response(
+            {"returned": len(returning), "results": results},
+            status=status.HTTP_200_OK
+        )
+
+
+class PaymentViewSet(DynamicQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPagination
+    pagination_class = EstimatedCountPageNumberPagination
     queryset = Payment.objects.all()
 
+    @property
+    def filterset_class(self):
+        if reads_archive(self.request):
+            return ArchivedPaymentFilter
+        return PaymentFilter
+
+    def get_serializer_class(self):
+        if reads_archive(self.request):
+            return ArchivedPaymentSerializer
+        return PaymentSerializer
+
     def get_queryset(self):
         user = self.request.user
-        qs = super().get_queryset()
+        if reads_archive(self.request):
+            qs = ArchivedPayment.objects.all()
+        else:
+            qs = super().get_queryset()
         if not user.is_staff:
             qs = qs.filter(borrowing__user=user)
         return qs
@@ -127,12 +435,27 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
-            payment = Payment.objects.get(session_id=session_id)
-            if session.payment_status == "paid":
-                payment.status = Payment.StatusChoices.PAID
-                payment.save(update_fields=["status"])
+            session = retrieve_checkout_session(session_id)
+            payment = Payment.objects.select_related("borrowing").get(
+                session_id=session_id
+            )
+            paid = Payment.StatusChoices.PAID
+            if session.payment_status == "paid" and payment.status != paid:
+                old_status = payment.status
+                with transaction.atomic():
+                    # Conditional, so concurrent callbacks count it once
+                    updated = Payment.objects.filter(
+                        pk=payment.pk,
+                        status=old_status
+                    ).update(status=paid)
+                    payment.status = paid
+                    if updated:
+                        record_payment_status_change(
+                            payment, payment.borrowing, old_status
+                        )
             return Response(PaymentSerializer(payment).data)
+        except PaymentServiceUnavailable:
+            raise
         except Exception as e:
             return Response(
                 {"error": str(e)},
@@ -146,3 +469,89 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         url_path="cancel")
     def cancel(self, request):
         return Response({"detail": "Payment was cancelled or paused."})
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """Staff reports answered from the daily rollup tables"""
+
+    permission_classes = [IsAdminUser]
+
+    def _date_range(self, request):
+        today = now().date()
+        date_from = request.query_params.get("date_from")
+        date_to = request.query_params.get("date_to")
+        try:
+            date_from = (
+                parse_date(date_from) if date_from
+                else today.replace(day=1)
+            )
+            date_to = parse_date(date_to) if date_to else today
+        except ValueError:
+            date_from = date_to = None
+        return date_from, date_to
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("date_from", OpenApiTypes.DATE),
+            OpenApiParameter("date_to", OpenApiTypes.DATE),
+        ],
+        responses=ReportSummarySerializer,
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_name="summary",
+        url_path="summary"
+    )
+    def summary(self, request):
+        date_from, date_to = self._date_range(request)
+        if not date_from or not date_to:
+            return Response(
+                {"detail": "date_from and date_to must be YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        totals = {
+            (row["type"], row["status"]): row["amount"]
+            for row in DailyPaymentTotal.objects.filter(
+                day__range=(date_from, date_to)
+            ).order_by().values("type", "status").annotate(
+                amount=Sum("amount")
+            )
+        }
+        circulation = DailyBookCirculation.objects.filter(
+            day__range=(date_from, date_to)
+        )
+        counts = circulation.aggregate(
+            borrowed=Sum("borrowed"),
+            returned=Sum("returned")
+        )
+        most_borrowed = (
+            circulation.order_by()
+            .values("book_id", "book__title")
+            .annotate(borrowed=Sum("borrowed"))
+            .order_by("-borrowed")[:10]
+        )
+
+        paid = Payment.StatusChoices.PAID
+        pending = Payment.StatusChoices.PENDING
+        return Response({
+            "date_from": date_from,
+            "date_to": date_to,
+            "revenue": totals.get((Payment.TypeChoices.PAYMENT, paid), 0),
+            "fines_collected": totals.get((Payment.TypeChoices.FINE, paid), 0),
+            "outstanding": sum(
+                amount for (_, payment_status), amount in totals.items()
+                if payment_status == pending
+            ),
+            "borrowed": counts["borrowed"] or 0,
+            "returned": counts["returned"] or 0,
+            "most_borrowed": [
+                {
+                    "book_id": row["book_id"],
+                    "title": row["book__title"],
+                    "borrowed": row["borrowed"],
+                }
+                for row in most_borrowed
+            ],
+        })
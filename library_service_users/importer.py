@@ -0,0 +1,142 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    created: int = 0
+    duplicates: int = 0
+    existing: int = 0
+    invalid: list = field(default_factory=list)
+
+
+def _init_worker():
+    # Needed where workers are spawned rather than forked (macOS, Windows)
+    django.setup()
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+class CustomerImporter:
+    """
+    Create customers from CSV rows (email, password, first_name, last_name).
+
+    Password hashing is the expensive part, so it runs in a process pool
+    on every core while the previous batch is inserted with one
+    bulk_create. Emails are normalized; rows whose email is invalid,
+    repeated in the input or already registered are skipped and counted.
+    An empty password creates an account that has to set one through
+    password reset.
+    """
+
+    def __init__(self, batch_size=1000, workers=None):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.model = get_user_model()
+        self.report = ImportReport()
+        self.seen = set()
+
+    def _clean(self, batch, first_line):
+        """Valid, new rows of a batch as (email, password, row)"""
+        cleaned = []
+        for line, row in enumerate(batch, start=first_line):
+            email = self.model.objects.normalize_email(
+                (row.get("email") or "").strip()
+            )
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.report.invalid.append(line)
+                continue
+            if email.lower() in self.seen:
+                self.report.duplicates += 1
+                continue
+            self.seen.add(email.lower())
+            cleaned.append((email, row.get("password") or None, row))
+
+        existing = set(
+            self.model.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=[email.lower() for email, *_ in cleaned])
+            .values_list("email_lower", flat=True)
+        )
+        self.report.existing += sum(
+            email.lower() in existing for email, *_ in cleaned
+        )
+        return [entry for entry in cleaned if entry[0].lower() not in existing]
+
+    def _insert(self, cleaned, hashes):
+        users = [
+            self.model(
+                email=email,
+                password=hashed,
+                first_name=(row.get("first_name") or "").strip(),
+                last_name=(row.get("last_name") or "").strip(),
+            )
+            for (email, _, row), hashed in zip(cleaned, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(users)
+        except IntegrityError:
+            # Someone registered one of the emails since the check
+            taken = set(
+                self.model.objects.filter(
+                    email__in=[user.email for user in users]
+                ).values_list("email", flat=True)
+            )
+            users = [user for user in users if user.email not in taken]
+            self.report.existing += len(taken)
+            with transaction.atomic():
+                self.model.objects.bulk_create(users)
+        self.report.created += len(users)
+
+    def run(self, rows, progress=None):
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker
+        ) as pool:
+            pending = None
+            line = 2  # Line 1 is the header
+            for batch in _batches(rows, self.batch_size):
+                self.report.read += len(batch)
+                cleaned = self._clean(batch, line)
+                line += len(batch)
+                # Start hashing this batch, then insert the previous one
+                hashes = pool.map(
+                    make_password,
+                    [password for _, password, _ in cleaned],
+                    chunksize=max(len(cleaned) // (self.workers * 4), 1),
+                )
+                if pending:
+                    self._insert(*pending)
+                    if progress:
+                        progress(self.report)
+                pending = cleaned, hashes
+            if pending:
+                self._insert(*pending)
+        return self.report
+
+
+def read_customers(file):
+    """Stream CSV rows as dicts with lowercase column names"""
+    reader = csv.DictReader(file)
+    reader.fieldnames = [
+        name.strip().lower() for name in reader.fieldnames or []
+    ]
+    return reader
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library_service_users.importer import CustomerImporter, read_customers
+
+
+class Command(BaseCommand):
+    help = ("Creates customers from a CSV file with email, password, "
+            "first_name and last_name columns")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, or - for stdin")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Password hashing processes (default: all cores)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(report):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{report.read} read, {report.created} created, "
+                f"{report.created / elapsed:.0f} customers/s"
+            )
+
+        importer = CustomerImporter(
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+        )
+        try:
+            if options["path"] == "-":
+                report = importer.run(read_customers(sys.stdin), progress)
+            else:
+                with open(options["path"], newline="",
+                          encoding="utf-8-sig") as file:
+                    report = importer.run(read_customers(file), progress)
+        except OSError as error:
+            raise CommandError(error)
+
+        elapsed = time.monotonic() - started
+        if report.invalid:
+            lines = ", ".join(map(str, report.invalid[:20]))
+            more = "..." if len(report.invalid) > 20 else ""
+            self.stderr.write(f"Invalid email on lines: {lines}{more}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report.created} of {report.read} customers in "
+            f"{elapsed:.1f}s ({report.created / max(elapsed, 1e-9):.0f}/s); "
+            f"skipped {report.duplicates} duplicate, {report.existing} "
+            f"existing and {len(report.invalid)} invalid rows"
+        ))
@@ -1,9 +1,17 @@
-from django.test import TestCase
+import tempfile
+import threading
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
 
+from library_service_users import throttling
+
 CREATE_USER_URL = reverse("library_service_users:create")
 TOKEN_URL = reverse("library_service_users:token_obtain_pair")
 ME_URL = reverse("library_service_users:manage")
@@ -138,3 +146,103 @@ class PrivateUserApiTests(TestCase):
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password(payload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class PasswordHashingPolicyTests(TestCase):
+    payload = {"email": "rehash@example.com", "password": "testpass123"}
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _login_and_get_hash(self):
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return get_user_model().objects.get(
+            email=self.payload["email"]
+        ).password
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_rehash_on_login_when_iterations_change(self):
+        create_user(**self.payload)
+
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            password = self._login_and_get_hash()
+
+        self.assertTrue(password.startswith("pbkdf2_sha256$2000$"))
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_rehash_on_login_when_policy_changes(self):
+        create_user(**self.payload)
+
+        with self.settings(
+            PASSWORD_HASHERS=[
+                "library_service_users.hashers.TunedArgon2PasswordHasher",
+                "library_service_users.hashers.TunedPBKDF2PasswordHasher",
+            ],
+            PASSWORD_ARGON2_MEMORY_COST=1024,
+        ):
+            password = self._login_and_get_hash()
+
+        self.assertTrue(password.startswith("argon2$"))
+
+    @override_settings(AUTH_HASHING_TIMEOUT=0)
+    def test_login_rejected_when_hashing_slots_busy(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with patch.object(throttling, "_slots", slots):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(AUTH_HASHING_TIMEOUT=30)
+    def test_login_rejected_at_once_when_queue_full(self):
+        queue = threading.BoundedSemaphore(1)
+        queue.acquire()
+        slots = MagicMock()
+        with patch.object(throttling, "_queue", queue), \
+                patch.object(throttling, "_slots", slots):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        slots.acquire.assert_not_called()
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+)
+class ImportCustomersTests(TestCase):
+    def test_import_normalizes_and_skips_duplicates(self):
+        create_user(email="taken@example.com", password="pass1234")
+        rows = (
+            "Email,Password,First_Name,Last_Name\n"
+            "new@EXAMPLE.com,secret1,Ann,Lee\n"
+            "NEW@example.com,secret2,Ann,Lee\n"
+            "Taken@example.com,secret3,Tom,Kay\n"
+            "not-an-email,secret4,Bad,Row\n"
+            "nopassword@example.com,,No,Pass\n"
+            "other@example.com,secret5,Bo,Ng\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(rows)
+            file.flush()
+            out, err = StringIO(), StringIO()
+            call_command(
+                "import_customers",
+                file.name,
+                batch_size=2,
+                workers=2,
+                stdout=out,
+                stderr=err
+            )
+
+        self.assertIn("Created 3 of 6", out.getvalue())
+        self.assertIn("lines: 5", err.getvalue())
+        user = get_user_model().objects.get(email="new@example.com")
+        self.assertTrue(user.check_password("secret1"))
+        self.assertEqual(user.first_name, "Ann")
+        self.assertFalse(
+            get_user_model().objects.get(
+                email="nopassword@example.com"
+            ).has_usable_password()
+        )
+        self.assertEqual(get_user_model().objects.count(), 4)
@@ -0,0 +1,59 @@
+import threading
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_slots = None
+_queue = None
+_slots_lock = threading.Lock()
+
+
+class AuthServiceBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = ("Too many sign-in requests right now, "
+                      "please try again in a moment.")
+    default_code = "auth_service_busy"
+
+
+def _hashing_slots():
+    global _slots, _queue
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                settings.AUTH_HASHING_CONCURRENCY
+            )
+        if _queue is None:
+            _queue = threading.BoundedSemaphore(
+                settings.AUTH_HASHING_CONCURRENCY
+                + settings.AUTH_HASHING_QUEUE
+            )
+    return _slots, _queue
+
+
+class BoundedHashingMixin:
+    """
+    Run the view in one of AUTH_HASHING_CONCURRENCY per-process slots.
+
+    Password hashing is CPU-bound; capping how many requests hash at once
+    leaves worker threads for catalog requests during a login burst.
+    At most AUTH_HASHING_QUEUE more requests wait for a slot, up to
+    AUTH_HASHING_TIMEOUT; the rest get a 503 at once, so waiting logins
+    cannot take the remaining threads either. This needs threaded
+    workers (gunicorn.conf.py): a sync worker serves one request at a
+    time and has no threads to leave free.
+    """
+
+    def post(self, request, *args, **kwargs):
+        slots, queue = _hashing_slots()
+        if not queue.acquire(blocking=False):
+            raise AuthServiceBusy()
+        try:
+            if not slots.acquire(timeout=settings.AUTH_HASHING_TIMEOUT):
+                raise AuthServiceBusy()
+            try:
+                return super().post(request, *args, **kwargs)
+            finally:
+                slots.release()
+        finally:
+            queue.release()
@@ -1,14 +1,20 @@
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from library_service_users.serializers import CustomerSerializer
+from library_service_users.throttling import BoundedHashingMixin
 
 
-class CreateCustomerView(generics.CreateAPIView):
+class CreateCustomerView(BoundedHashingMixin, generics.CreateAPIView):
     serializer_class = CustomerSerializer
 
 
+class CustomerTokenObtainPairView(BoundedHashingMixin, TokenObtainPairView):
+    pass
+
+
 class ManageCustomerView(generics.RetrieveUpdateAPIView):
     serializer_class = CustomerSerializer
     authentication_classes = (JWTAuthentication,)